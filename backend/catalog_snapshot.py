@@ -0,0 +1,176 @@
+import math
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# column used by `query(sort_by=...)` -> attribute of the snapshot
+SORT_COLUMNS = ('rating', 'sentiment', 'sentiment_mean', 'review_count')
+ENCODED_FIELDS = ('title', 'director', 'category')
+
+
+class Dictionary:
+    '''Dictionary encoding of one string column: value <-> int32 code.'''
+
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def encode(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+    def lookup(self, value: str) -> int:
+        '''Code of an existing value, -2 (matches nothing) for an unknown one.'''
+        return self.codes.get(value, -2)
+
+
+def _as_float(value: Optional[float]) -> float:
+    return math.nan if value is None else float(value)
+
+
+class CatalogSnapshot:
+    '''
+    In-memory columnar copy of the movie catalog.
+
+    Numeric fields are NumPy float / int arrays, title / director / category are
+    dictionary-encoded int32 codes, so filters, counts and top-k are vectorized masks.
+    Each slot also keeps the ready-made response object (`payload`) of the movie,
+    so reads return it without touching the DB or reshaping rows again.
+    Deleted slots are only marked dead and the arrays are compacted once a quarter of them is dead.
+    '''
+
+    def __init__(self, capacity: int = 1024):
+        self._lock = threading.RLock()
+        # change log position the snapshot is synced to
+        self.seq = 0
+        self._reset(capacity)
+
+    def _reset(self, capacity: int):
+        self.size = 0
+        self.dead = 0
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.rating = np.full(capacity, np.nan)
+        self.sentiment = np.full(capacity, np.nan)
+        self.sentiment_mean = np.full(capacity, np.nan)
+        self.review_count = np.zeros(capacity, dtype=np.int64)
+        self.codes = {field: np.full(capacity, -1, dtype=np.int32) for field in ENCODED_FIELDS}
+        self.dictionaries = {field: Dictionary() for field in ENCODED_FIELDS}
+        self.payloads: List[Any] = [None] * capacity
+        self.slots: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def _grow(self):
+        capacity = len(self.ids) * 2
+        self.ids = np.concatenate([self.ids, np.zeros(capacity - len(self.ids), dtype=np.int64)])
+        self.alive = np.concatenate([self.alive, np.zeros(capacity - len(self.alive), dtype=bool)])
+        for name in ('rating', 'sentiment', 'sentiment_mean'):
+            column = getattr(self, name)
+            setattr(self, name, np.concatenate([column, np.full(capacity - len(column), np.nan)]))
+        self.review_count = np.concatenate([self.review_count, np.zeros(capacity - len(self.review_count), dtype=np.int64)])
+        for field, column in self.codes.items():
+            self.codes[field] = np.concatenate([column, np.full(capacity - len(column), -1, dtype=np.int32)])
+        self.payloads.extend([None] * (capacity - len(self.payloads)))
+
+    def load(self, movies: List[Any], seq: int):
+        '''
+        Replace the whole snapshot. `movies` are response objects (id, title, director, category,
+        rating, predicted_sentiment, sentiment_mean, review_count attributes).
+        '''
+        with self._lock:
+            self._reset(max(1024, len(movies) * 2))
+            for movie in movies:
+                self._upsert_locked(movie)
+            self.seq = seq
+
+    def _upsert_locked(self, movie: Any):
+        slot = self.slots.get(movie.id)
+        if slot is None:
+            if self.size == len(self.ids):
+                self._grow()
+            slot = self.size
+            self.size += 1
+            self.slots[movie.id] = slot
+        self.ids[slot] = movie.id
+        self.alive[slot] = True
+        self.rating[slot] = _as_float(movie.rating)
+        sentiment = movie.predicted_sentiment or {}
+        self.sentiment[slot] = _as_float(sentiment.get('positive'))
+        self.sentiment_mean[slot] = _as_float(movie.sentiment_mean)
+        self.review_count[slot] = movie.review_count or 0
+        for field in ENCODED_FIELDS:
+            self.codes[field][slot] = self.dictionaries[field].encode(getattr(movie, field))
+        self.payloads[slot] = movie
+
+    def upsert(self, movie: Any):
+        with self._lock:
+            self._upsert_locked(movie)
+
+    def remove(self, movie_id: int):
+        with self._lock:
+            slot = self.slots.pop(movie_id, None)
+            if slot is None:
+                return
+            self.alive[slot] = False
+            self.payloads[slot] = None
+            self.dead += 1
+            if self.dead > max(1024, self.size // 4):
+                self._compact_locked()
+
+    def _compact_locked(self):
+        movies = [self.payloads[slot] for slot in np.flatnonzero(self.alive[:self.size])]
+        seq = self.seq
+        self._reset(max(1024, len(movies) * 2))
+        for movie in movies:
+            self._upsert_locked(movie)
+        self.seq = seq
+
+    def _mask(self, title: Optional[str] = None, director: Optional[str] = None, category: Optional[str] = None,
+              min_rating: Optional[float] = None, max_rating: Optional[float] = None) -> np.ndarray:
+        mask = self.alive[:self.size].copy()
+        for field, value in (('title', title), ('director', director), ('category', category)):
+            if value:
+                mask &= self.codes[field][:self.size] == self.dictionaries[field].lookup(value)
+        # NaN (no rating) never satisfies a rating bound
+        if min_rating is not None:
+            mask &= self.rating[:self.size] >= min_rating
+        if max_rating is not None:
+            mask &= self.rating[:self.size] <= max_rating
+        return mask
+
+    def count(self, **filters) -> int:
+        with self._lock:
+            return int(np.count_nonzero(self._mask(**filters)))
+
+    def query(self, sort_by: Optional[str] = None, k: Optional[int] = None, **filters) -> List[Any]:
+        '''
+        Movies matching all the given filters (exact match for title / director / category).
+        Without `sort_by` they come in id order, otherwise in descending `sort_by` order
+        (missing values last); `k` keeps only the first k (top-k).
+        '''
+        if sort_by is not None and sort_by not in SORT_COLUMNS:
+            raise ValueError(f'sort_by must be one of {SORT_COLUMNS}')
+        with self._lock:
+            slots = np.flatnonzero(self._mask(**filters))
+            if sort_by is None:
+                slots = slots[np.argsort(self.ids[slots], kind='stable')]
+            else:
+                values = getattr(self, sort_by)[slots].astype(np.float64)
+                values = np.where(np.isnan(values), -np.inf, values)
+                if k is not None and k < len(slots):
+                    # every row tied with the k-th value stays a candidate: which of them make the cut is decided by id
+                    kth = -np.partition(-values, k - 1)[k - 1]
+                    candidates = values >= kth
+                    slots, values = slots[candidates], values[candidates]
+                # descending value, then ascending id for ties
+                slots = slots[np.lexsort((self.ids[slots], -values))]
+            if k is not None:
+                slots = slots[:k]
+            return [self.payloads[slot] for slot in slots]
@@ -0,0 +1,103 @@
+import asyncio
+from dataclasses import dataclass, asdict
+from typing import Callable, Dict, List, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+
+@dataclass
+class CoalescingStats:
+    '''Counters of the single-flight layer, served by `/metrics/coalescing`.'''
+    requests: int = 0
+    executed: int = 0
+    collapsed: int = 0
+    failed: int = 0
+    inflight: int = 0
+
+    def as_dict(self) -> Dict[str, float]:
+        stats = asdict(self)
+        stats['collapse_ratio'] = self.collapsed / self.requests if self.requests else 0.0
+        return stats
+
+
+def request_key(scope) -> Tuple[str, str]:
+    '''Same path + same query parameters (in any order) = same request.'''
+    query = parse_qsl(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True)
+    return scope['path'], urlencode(sorted(query))
+
+
+class SingleFlightMiddleware:
+    '''
+    ASGI middleware collapsing identical concurrent GET requests into one execution.
+
+    The first request of a key (the leader) runs the app and its response is buffered;
+    requests with the same key arriving while it is in flight wait for it and receive
+    a copy of the same response (marked with `x-coalesced: 1`) instead of running the
+    query and the serialization again. Nothing is cached once the leader has finished.
+    '''
+
+    def __init__(self, app, should_coalesce: Callable[[dict], bool], stats: CoalescingStats):
+        self.app = app
+        self.should_coalesce = should_coalesce
+        self.stats = stats
+        self.inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] != 'GET' or not self.should_coalesce(scope):
+            await self.app(scope, receive, send)
+            return
+
+        self.stats.requests += 1
+        key = request_key(scope)
+        flight = self.inflight.get(key)
+        if flight is not None:
+            try:
+                # shield: a follower that disconnects must not cancel the leader's work
+                messages = await asyncio.shield(flight)
+            except asyncio.CancelledError:
+                if not flight.cancelled():
+                    raise
+                messages = None
+            except Exception:
+                messages = None
+            if messages is None:
+                # the leader failed or was cancelled: answer this request on its own
+                self.stats.executed += 1
+                await self.app(scope, receive, send)
+                return
+            self.stats.collapsed += 1
+            await self._replay(messages, send, coalesced=True)
+            return
+
+        flight = asyncio.get_running_loop().create_future()
+        self.inflight[key] = flight
+        self.stats.executed += 1
+        self.stats.inflight += 1
+        messages: List[dict] = []
+
+        async def capture(message):
+            messages.append(message)
+
+        try:
+            await self.app(scope, receive, capture)
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        except Exception as e:
+            self.stats.failed += 1
+            flight.set_exception(e)
+            # followers fall back to their own execution; mark it retrieved when there are none
+            flight.exception()
+            raise
+        else:
+            flight.set_result(messages)
+        finally:
+            self.stats.inflight -= 1
+            del self.inflight[key]
+        await self._replay(messages, send, coalesced=False)
+
+    @staticmethod
+    async def _replay(messages: List[dict], send, coalesced: bool):
+        for message in messages:
+            if coalesced and message['type'] == 'http.response.start':
+                message = dict(message, headers=list(message.get('headers', [])) + [(b'x-coalesced', b'1')])
+            await send(message)
@@ -0,0 +1,210 @@
+import os
+import json
+import logging
+import threading
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# rows scored per matmul: bounds the float32 copy of a float16 / memory-mapped slice
+SCORE_CHUNK_ROWS = 16384
+ANN_ITERATIONS = 8
+
+
+def encode_vector(vector: Sequence[float]) -> bytes:
+    '''float32 little-endian blob, as stored in `movie_embeddings.vector`.'''
+    return np.asarray(vector, dtype='<f4').tobytes()
+
+
+def decode_vector(blob: bytes) -> np.ndarray:
+    return np.frombuffer(blob, dtype='<f4').astype(np.float32)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+
+class EmbeddingIndex:
+    '''
+    Movie embeddings as unit vectors in a memory-mapped .npy matrix, row = movie id
+    (an all-zero row is a movie without embedding), so cosine similarity is one chunked matmul.
+
+    The matrix is a cache of the `movie_embeddings` table: `seq` (the change log position it is
+    synced to) is saved next to it, so a restart only applies the changes made since.
+    Above `ann_min_movies` embeddings, queries go through an IVF index (spherical k-means lists,
+    only the `ann_probes` closest lists are scanned) instead of the whole matrix.
+    '''
+
+    def __init__(self, path: str, dtype: str = 'float32', ann_min_movies: int = 50000, ann_probes: int = 8):
+        self.path = path
+        self.meta_path = path + '.json'
+        self.dtype = np.dtype(dtype)
+        self.ann_min_movies = ann_min_movies
+        self.ann_probes = ann_probes
+        self.seq = 0
+        self.matrix: Optional[np.memmap] = None
+        self.present = np.zeros(0, dtype=bool)
+        self._lock = threading.RLock()
+        self._ann = None
+        # movies written since the IVF lists were built, always scored exactly
+        self._ann_dirty = set()
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.present))
+
+    @property
+    def dim(self) -> Optional[int]:
+        return None if self.matrix is None else self.matrix.shape[1]
+
+    def open(self) -> bool:
+        '''
+        Map the saved matrix. Returns False when there is none (or it does not match `dtype`): the caller rebuilds it.
+        '''
+        with self._lock:
+            try:
+                with open(self.meta_path) as f:
+                    meta = json.load(f)
+                matrix = np.load(self.path, mmap_mode='r+')
+            except (OSError, ValueError):
+                return False
+            if matrix.dtype != self.dtype or matrix.ndim != 2:
+                return False
+            self.matrix = matrix
+            self.present = self._norms(matrix.shape[0]) > 0
+            self.seq = meta['seq']
+            self._ann = None
+            return True
+
+    def reset(self, dim: int, capacity: int = 1024):
+        with self._lock:
+            self._create(dim, capacity)
+            self.seq = 0
+
+    def _create(self, dim: int, capacity: int, copy_from: Optional[np.ndarray] = None):
+        tmp_path = self.path + '.tmp'
+        matrix = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=self.dtype, shape=(capacity, dim))
+        present = np.zeros(capacity, dtype=bool)
+        if copy_from is not None:
+            matrix[:len(copy_from)] = copy_from
+            present[:len(self.present)] = self.present
+        matrix.flush()
+        os.replace(tmp_path, self.path)
+        self.matrix = matrix
+        self.present = present
+        self._ann = None
+
+    def _norms(self, rows: int) -> np.ndarray:
+        norms = np.zeros(rows, dtype=np.float32)
+        for start in range(0, rows, SCORE_CHUNK_ROWS):
+            chunk = np.asarray(self.matrix[start:start + SCORE_CHUNK_ROWS], dtype=np.float32)
+            norms[start:start + len(chunk)] = np.linalg.norm(chunk, axis=1)
+        return norms
+
+    def set(self, movie_id: int, vector: Optional[np.ndarray]):
+        '''Store the (normalized) embedding of a movie, or clear it with None.'''
+        with self._lock:
+            if vector is None:
+                if self.matrix is not None and movie_id < len(self.present) and self.present[movie_id]:
+                    self.matrix[movie_id] = 0
+                    self.present[movie_id] = False
+                    self._ann_dirty.add(movie_id)
+                return
+            vector = np.asarray(vector, dtype=np.float32)
+            if self.matrix is None:
+                self.reset(len(vector))
+            if len(vector) != self.dim:
+                raise ValueError(f'Embedding dimension {len(vector)} != {self.dim}')
+            if movie_id >= len(self.matrix):
+                self._create(self.dim, max(movie_id + 1, len(self.matrix) * 2), copy_from=self.matrix)
+            self.matrix[movie_id] = _normalize(vector)
+            self.present[movie_id] = True
+            self._ann_dirty.add(movie_id)
+
+    def flush(self, seq: int):
+        '''Persist the matrix and the change log position it reflects.'''
+        with self._lock:
+            self.seq = seq
+            if self.matrix is None:
+                return
+            self.matrix.flush()
+            tmp_path = self.meta_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump({'seq': seq, 'dim': self.dim, 'dtype': self.dtype.name}, f)
+            os.replace(tmp_path, self.meta_path)
+
+    def get(self, movie_id: int) -> Optional[np.ndarray]:
+        with self._lock:
+            if movie_id >= len(self.present) or not self.present[movie_id]:
+                return None
+            return np.asarray(self.matrix[movie_id], dtype=np.float32)
+
+    def _scores(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        if rows is not None:
+            return np.asarray(self.matrix[rows], dtype=np.float32) @ query
+        scores = np.empty(len(self.matrix), dtype=np.float32)
+        for start in range(0, len(self.matrix), SCORE_CHUNK_ROWS):
+            chunk = np.asarray(self.matrix[start:start + SCORE_CHUNK_ROWS], dtype=np.float32)
+            scores[start:start + len(chunk)] = chunk @ query
+        return scores
+
+    def _build_ann(self):
+        ids = np.flatnonzero(self.present)
+        vectors = np.asarray(self.matrix[ids], dtype=np.float32)
+        n_lists = max(1, int(np.sqrt(len(ids))))
+        rng = np.random.default_rng(0)
+        centroids = vectors[rng.choice(len(ids), n_lists, replace=False)]
+        for _ in range(ANN_ITERATIONS):
+            assign = self._nearest(vectors, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, vectors)
+            # an emptied list keeps its previous centroid
+            centroids = np.where(np.linalg.norm(sums, axis=1, keepdims=True) > 0, _normalize(sums), centroids)
+        assign = self._nearest(vectors, centroids)
+        order = np.argsort(assign, kind='stable')
+        offsets = np.searchsorted(assign[order], np.arange(n_lists + 1))
+        self._ann = (centroids, ids[order], offsets)
+        self._ann_dirty = set()
+        logging.info(f"Similarity IVF index built: {len(ids)} movies, {n_lists} lists")
+
+    @staticmethod
+    def _nearest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        assign = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), SCORE_CHUNK_ROWS):
+            assign[start:start + SCORE_CHUNK_ROWS] = np.argmax(vectors[start:start + SCORE_CHUNK_ROWS] @ centroids.T, axis=1)
+        return assign
+
+    def _ann_candidates(self, query: np.ndarray) -> np.ndarray:
+        # rebuild once a tenth of the catalog changed since the last build
+        if self._ann is None or len(self._ann_dirty) > len(self._ann[1]) // 10:
+            self._build_ann()
+        centroids, ids, offsets = self._ann
+        probes = np.argsort(-(centroids @ query))[:self.ann_probes]
+        candidates = [ids[offsets[probe]:offsets[probe + 1]] for probe in probes]
+        candidates.append(np.fromiter(self._ann_dirty, dtype=np.int64, count=len(self._ann_dirty)))
+        candidates = np.unique(np.concatenate(candidates))
+        return candidates[self.present[candidates]]
+
+    def similar(self, movie_id: int, k: int) -> List[Tuple[int, float]]:
+        '''
+        Returns:
+            up to k (movie_id, cosine similarity) pairs, most similar first, without the movie itself.
+            Empty when the movie has no embedding.
+        '''
+        with self._lock:
+            query = self.get(movie_id)
+            if query is None:
+                return []
+            if len(self) >= self.ann_min_movies:
+                rows = self._ann_candidates(query)
+                scores = self._scores(query, rows)
+            else:
+                rows = np.flatnonzero(self.present)
+                scores = self._scores(query)[rows]
+            keep = rows != movie_id
+            rows, scores = rows[keep], scores[keep]
+            if k < len(rows):
+                top = np.argpartition(-scores, k - 1)[:k]
+                rows, scores = rows[top], scores[top]
+            order = np.lexsort((rows, -scores))
+            return [(int(rows[i]), float(scores[i])) for i in order]
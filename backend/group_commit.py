@@ -0,0 +1,120 @@
+import asyncio
+from typing import Any, Callable, List, Optional, Tuple
+
+from sqlalchemy import event
+
+# op(session) -> result: reads, validates, writes and flushes; must not commit
+WriteOp = Callable[[Any], Any]
+
+
+def enable_savepoints(engine, begin: str = 'BEGIN IMMEDIATE'):
+    '''
+    Let SQLAlchemy emit the BEGIN of a SQLite engine so SAVEPOINTs nest in it.
+    pysqlite only begins a transaction before DML by itself: a SAVEPOINT issued first becomes the
+    transaction and its RELEASE commits. `BEGIN IMMEDIATE` takes the write lock for the whole batch.
+    '''
+    def disable_driver_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    def emit_begin(conn):
+        conn.exec_driver_sql(begin)
+
+    event.listen(engine, 'connect', disable_driver_transactions)
+    event.listen(engine, 'begin', emit_begin)
+
+
+class GroupCommitter:
+    '''
+    Single writer task committing queued writes together (group commit).
+
+    Callers `await submit(op)`: ops are collected until `max_batch` of them are queued or
+    `max_delay` seconds passed since the first one, then run one after another in the same
+    session and committed in one transaction (one fsync, one lock acquisition for the batch).
+    The caller gets the op's return value once the commit is durable.
+    Every op runs in its own SAVEPOINT: an op that raises (ex. 404) only rolls back its own writes,
+    so a rejected write never fails (or reruns) its neighbours. The sessions must support SAVEPOINTs
+    (`enable_savepoints` for SQLite).
+    '''
+
+    def __init__(self, session_factory: Callable[[], Any], max_batch: int = 64, max_delay: float = 0.005):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        '''Commit what is still queued, then stop the writer.'''
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    async def submit(self, op: WriteOp) -> Any:
+        if self._task is None:
+            # writer not started (ex. app used without lifespan): commit this op alone
+            [(ok, value)] = await asyncio.to_thread(self._commit, [op])
+            if not ok:
+                raise value
+            return value
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((op, future))
+        return await future
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = asyncio.get_running_loop().time() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - asyncio.get_running_loop().time()
+                try:
+                    item = self._queue.get_nowait() if timeout <= 0 else await asyncio.wait_for(self._queue.get(), timeout)
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            try:
+                results = await asyncio.to_thread(self._commit, [op for op, _ in batch])
+            except Exception as e:
+                results = [(False, e)] * len(batch)
+            for (_, future), (ok, value) in zip(batch, results):
+                if future.cancelled():
+                    continue
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+    def _commit(self, ops: List[WriteOp]) -> List[Tuple[bool, Any]]:
+        results: List[Tuple[bool, Any]] = []
+        with self.session_factory() as session:
+            try:
+                for op in ops:
+                    savepoint = session.begin_nested()
+                    try:
+                        value = op(session)
+                        savepoint.commit()
+                    except Exception as e:
+                        savepoint.rollback()
+                        results.append((False, e))
+                    else:
+                        results.append((True, value))
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                # BEGIN or COMMIT failed: nothing of the batch was written (rejected ops keep their own error)
+                results += [(True, None)] * (len(ops) - len(results))
+                return [(False, e) if ok else (ok, value) for ok, value in results]
+        return results
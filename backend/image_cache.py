@@ -0,0 +1,236 @@
+import io
+import os
+import socket
+import hashlib
+import logging
+import ipaddress
+import threading
+import http.client
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import OrderedDict
+from typing import Callable, Dict, Tuple
+
+from PIL import Image
+
+# thumbnail widths actually produced; requested widths are rounded up to one of them
+WIDTH_BUCKETS = (64, 140, 200, 320, 480, 640, 800, 1024)
+FORMATS = {'webp': ('WEBP', 'image/webp'), 'jpeg': ('JPEG', 'image/jpeg')}
+ALLOWED_SCHEMES = ('http', 'https')
+# decoded size limit of a poster (a small file can still decode to a huge bitmap)
+MAX_IMAGE_PIXELS = 40_000_000
+
+Fetcher = Callable[[str], bytes]
+
+
+def is_public_address(address: str) -> bool:
+    '''False for loopback, private, link-local, multicast, reserved and unspecified addresses.'''
+    ip = ipaddress.ip_address(address.split('%', 1)[0])
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+def public_connection(address, *args, **kwargs) -> socket.socket:
+    '''
+    `socket.create_connection` that refuses non public peers.
+    The check is on the address actually connected to, so DNS rebinding between a check and the
+    connection cannot reach an internal host; it happens before any byte (or TLS handshake) is sent.
+    '''
+    sock = socket.create_connection(address, *args, **kwargs)
+    peer = sock.getpeername()[0]
+    if not is_public_address(peer):
+        sock.close()
+        raise urllib.error.URLError(f'Refusing to fetch from non public address {peer}')
+    return sock
+
+
+class PublicHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = public_connection
+
+
+class PublicHTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = public_connection
+
+
+class PublicHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(PublicHTTPConnection, req)
+
+
+class PublicHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(PublicHTTPSConnection, req, context=self._context)
+
+
+class HTTPOnlyRedirectHandler(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        if urllib.parse.urlsplit(newurl).scheme not in ALLOWED_SCHEMES:
+            raise urllib.error.HTTPError(newurl, code, 'Redirect to a non http(s) url', headers, fp)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+def url_fetcher(timeout: float = 10.0, max_bytes: int = 10 * 1024 * 1024) -> Fetcher:
+    '''
+    Default fetcher: HTTP(S) GET of the poster url, refusing bodies over `max_bytes`.
+    `image_url` comes from clients, so only http / https urls of public hosts are fetched
+    (redirects included): no file://, no loopback / private / link-local services.
+    '''
+    # no FileHandler / FTPHandler / ProxyHandler: only the handlers below exist
+    opener = urllib.request.OpenerDirector()
+    for handler in (PublicHTTPHandler(), PublicHTTPSHandler(), HTTPOnlyRedirectHandler(),
+                    urllib.request.HTTPDefaultErrorHandler(), urllib.request.HTTPErrorProcessor()):
+        opener.add_handler(handler)
+
+    def fetch(url: str) -> bytes:
+        if urllib.parse.urlsplit(url).scheme.lower() not in ALLOWED_SCHEMES:
+            raise ValueError(f'Only http(s) poster urls are fetched: {url}')
+        request = urllib.request.Request(url, headers={'User-Agent': 'movie-app-image-proxy/1.0'})
+        with opener.open(request, timeout=timeout) as response:
+            data = response.read(max_bytes + 1)
+        if len(data) > max_bytes:
+            raise ValueError(f'Image larger than {max_bytes} bytes: {url}')
+        return data
+    return fetch
+
+
+def open_image(data: bytes) -> Image.Image:
+    '''Open an image (header only) and refuse decompression bombs before any pixel is decoded.'''
+    image = Image.open(io.BytesIO(data))
+    if image.width * image.height > MAX_IMAGE_PIXELS:
+        raise ValueError(f'Image of {image.width}x{image.height} pixels exceeds {MAX_IMAGE_PIXELS} pixels')
+    return image
+
+
+def snap_width(width: int) -> int:
+    for bucket in WIDTH_BUCKETS:
+        if width <= bucket:
+            return bucket
+    return WIDTH_BUCKETS[-1]
+
+
+def url_version(url: str) -> str:
+    '''Short hash of the source url, used as `v=` so a changed poster gets a new (cacheable forever) URL.'''
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()[:12]
+
+
+class ImageCache:
+    '''
+    Size-bounded LRU disk cache of posters.
+
+    The original image of a url is downloaded once (through the pluggable `fetcher`) and stored,
+    then every (url, width, format) thumbnail is resized from it and stored as its own file.
+    Recency is the file mtime, so the LRU order survives restarts.
+    '''
+
+    def __init__(self, directory: str, max_bytes: int, fetcher: Fetcher):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.fetcher = fetcher
+        self._lock = threading.Lock()
+        # one lock per key: concurrent misses of the same thumbnail fetch / resize once
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._entries: 'OrderedDict[str, int]' = OrderedDict()
+        self._size = 0
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith('.tmp'):
+                os.remove(path)
+            elif os.path.isfile(path):
+                stat = os.stat(path)
+                files.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._size += size
+
+    @staticmethod
+    def key(url: str, width: int, fmt: str) -> str:
+        return hashlib.sha1(f'{url}\0{width}\0{fmt}'.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def _read(self, key: str):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+        try:
+            with open(self._path(key), 'rb') as f:
+                data = f.read()
+            os.utime(self._path(key))
+            return data
+        except FileNotFoundError:
+            with self._lock:
+                self._size -= self._entries.pop(key, 0)
+            return None
+
+    def _write(self, key: str, data: bytes):
+        tmp_path = self._path(key) + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(key))
+        with self._lock:
+            self._size += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                old_key, old_size = self._entries.popitem(last=False)
+                self._size -= old_size
+                try:
+                    os.remove(self._path(old_key))
+                except FileNotFoundError:
+                    pass
+
+    def _get_or_create(self, key: str, create: Callable[[], bytes]) -> bytes:
+        data = self._read(key)
+        if data is not None:
+            return data
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            data = self._read(key)
+            if data is None:
+                data = create()
+                self._write(key, data)
+        with self._lock:
+            self._key_locks.pop(key, None)
+        return data
+
+    def original(self, url: str) -> bytes:
+        def fetch() -> bytes:
+            data = self.fetcher(url)
+            # not an image, or too large once decoded: nothing is cached
+            open_image(data)
+            return data
+        return self._get_or_create(self.key(url, 0, 'orig'), fetch)
+
+    def thumbnail(self, url: str, width: int, fmt: str) -> Tuple[bytes, str, str]:
+        '''
+        Returns:
+            (data, media_type, key) of the `fmt` thumbnail of `url`, `width` pixels wide at most.
+        '''
+        width = snap_width(width)
+        pil_format, media_type = FORMATS[fmt]
+        key = self.key(url, width, fmt)
+
+        def create() -> bytes:
+            image = open_image(self.original(url))
+            image.thumbnail((width, width * 3), Image.LANCZOS)
+            if image.mode not in ('RGB', 'RGBA') or pil_format == 'JPEG':
+                image = image.convert('RGB')
+            out = io.BytesIO()
+            image.save(out, pil_format, quality=82)
+            logging.info(f"Poster thumbnail created: {width}px {fmt} ({out.tell()} bytes) for {url}")
+            return out.getvalue()
+
+        return self._get_or_create(key, create), media_type, key
@@ -1,38 +1,318 @@
-from fastapi import FastAPI,HTTPException, Query, Path, Body, Depends
-from sqlmodel import Field, Session, SQLModel, create_engine, select, and_
+from fastapi import FastAPI,HTTPException, Query, Path, Body, Depends, Response, Header
+from sqlmodel import Field, Session, SQLModel, create_engine, select, and_, or_, func
 from contextlib import asynccontextmanager
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from transformers import AutoTokenizer, BertForSequenceClassification
 import torch
+import numpy as np
 
-from typing import Annotated, Optional, Dict, List
+from typing import Annotated, Optional, Dict, List, Tuple, Hashable, Literal
 import json
-from sqlalchemy import Column, Text
+import os
+import asyncio
+import socket
+import threading
+import uuid
+import time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import Column, Text, LargeBinary, insert, update, delete, event
+from sqlalchemy.exc import OperationalError
+
+from suggest_index import SuggestIndex
+from catalog_snapshot import CatalogSnapshot
+from coalescing import SingleFlightMiddleware, CoalescingStats
+from image_cache import ImageCache, url_fetcher, url_version
+from embedding_index import EmbeddingIndex, encode_vector, decode_vector
+from group_commit import GroupCommitter, enable_savepoints
+from profiling import ProfilingMiddleware, SlowTraceBuffer, span, record_span
+from review_batching import split_windows, build_batches, aggregate_scores
+from tokenization import review_hash, encode_token_ids, decode_token_ids, load_fast_tokenizer
 
 import logging
 logging.basicConfig(level=logging.INFO)
 
 model_is_ready = False
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+TOKENIZER_NAME = 'monologg/kobert'
+USE_FAST_TOKENIZER = os.getenv('USE_FAST_TOKENIZER', '1') == '1'
 # Model load
 try:
-    tokenizer = AutoTokenizer.from_pretrained('monologg/kobert', trust_remote_code=True)
+    tokenizer = AutoTokenizer.from_pretrained(TOKENIZER_NAME, trust_remote_code=True)
+    # Rust-backed tokenizer, only used when it reproduces the slow tokenizer ids
+    fast_tokenizer = load_fast_tokenizer(tokenizer) if USE_FAST_TOKENIZER else None
+    if fast_tokenizer is not None:
+        logging.info("Using fast tokenizer")
+        tokenizer = fast_tokenizer
     model = BertForSequenceClassification.from_pretrained('jeonghyeon97/koBERT-Senti5').to(device)
     model_is_ready = True
 except Exception as e:
     logging.error(f"Model loading failed: {e}")
 
+# Review scoring settings
+REVIEW_MAX_LENGTH = 512
+REVIEW_WINDOW_STRIDE = int(os.getenv('REVIEW_WINDOW_STRIDE', 128))
+# padded tokens (batch size * longest window) per forward pass
+REVIEW_TOKEN_BUDGET = int(os.getenv('REVIEW_TOKEN_BUDGET', 8192))
+# movies leased, scored and committed together (one streamed batch)
+ANALYZE_CHUNK_SIZE = int(os.getenv('ANALYZE_CHUNK_SIZE', 32))
+# a lease must outlive the analysis of one chunk; expired leases are reclaimed by other workers
+ANALYZE_LEASE_SECONDS = int(os.getenv('ANALYZE_LEASE_SECONDS', 300))
+WORKER_ID = os.getenv('WORKER_ID') or f"{socket.gethostname()}-{os.getpid()}"
+
+# Change feed compaction: delete tombstones beyond the newest CHANGE_LOG_TOMBSTONES, every CHANGE_LOG_COMPACT_SECONDS
+CHANGE_LOG_TOMBSTONES = int(os.getenv('CHANGE_LOG_TOMBSTONES', 10000))
+CHANGE_LOG_COMPACT_SECONDS = int(os.getenv('CHANGE_LOG_COMPACT_SECONDS', 600))
+
+# Read engine of the catalog: 'sqlite' (default) or 'columnar' (in-memory NumPy snapshot)
+CATALOG_READ_ENGINE = os.getenv('CATALOG_READ_ENGINE', 'sqlite')
+# how often the snapshot picks up writes made by other processes (workers, replicas)
+CATALOG_SYNC_SECONDS = float(os.getenv('CATALOG_SYNC_SECONDS', 1.0))
+
+# Poster proxy: originals and resized thumbnails cached on disk (LRU, bounded by IMAGE_CACHE_MAX_BYTES)
+IMAGE_CACHE_DIR = os.getenv('IMAGE_CACHE_DIR', 'image_cache')
+IMAGE_CACHE_MAX_BYTES = int(os.getenv('IMAGE_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+# Similar movies: review embeddings matrix ('float32' or 'float16'), IVF index above SIMILAR_ANN_MIN_MOVIES movies
+EMBEDDING_DTYPE = os.getenv('EMBEDDING_DTYPE', 'float32')
+SIMILAR_ANN_MIN_MOVIES = int(os.getenv('SIMILAR_ANN_MIN_MOVIES', 50000))
+SIMILAR_ANN_PROBES = int(os.getenv('SIMILAR_ANN_PROBES', 8))
+# the matrix is a per-process cache of `movie_embeddings`: kept off the `data/` volume every replica mounts,
+# where a replica replacing the file (growth) or its saved seq would break the memmap / position of the others
+EMBEDDING_CACHE_DIR = os.getenv('EMBEDDING_CACHE_DIR', 'embedding_cache')
+
+# Group commit of review / movie writes: one transaction per GROUP_COMMIT_MAX_BATCH writes or GROUP_COMMIT_MAX_DELAY_MS
+GROUP_COMMIT_MAX_BATCH = int(os.getenv('GROUP_COMMIT_MAX_BATCH', 64))
+GROUP_COMMIT_MAX_DELAY_MS = float(os.getenv('GROUP_COMMIT_MAX_DELAY_MS', 5))
+
+# Profiling / slow request traces, only served to requests with `X-Admin-Token: ADMIN_TOKEN` (disabled when unset)
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+SLOW_REQUEST_MS = float(os.getenv('SLOW_REQUEST_MS', 500))
+SLOW_TRACE_BUFFER = int(os.getenv('SLOW_TRACE_BUFFER', 100))
+PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', 5))
+
 #SQLite Dataset load
-sqlite_file_name = 'movies.db'
+# the whole directory is shared by replicas / workers: WAL mode keeps its -wal / -shm files next to the database
+sqlite_file_name = os.getenv('SQLITE_DB_PATH', os.path.join('data', 'movies.db'))
+os.makedirs(os.path.dirname(sqlite_file_name) or '.', exist_ok=True)
 sqlite_url = f"sqlite:///{sqlite_file_name}"
-connect_args = {"check_same_thread": False}
+# replicas / workers share the file: wait for the write lock instead of failing at once
+connect_args = {"check_same_thread": False, "timeout": 30}
 engine = create_engine(sqlite_url, echo=False, connect_args=connect_args,)
 
+# readers no longer block the writer (and the other way around); the mode is persistent in the file
+def enable_wal(dbapi_connection, connection_record):
+    dbapi_connection.execute('PRAGMA journal_mode=WAL')
+
+event.listen(engine, 'connect', enable_wal)
+# every SQL statement is a `db` span of the traced request (requests are only traced when ADMIN_TOKEN is set)
+def start_db_span(conn, cursor, statement, parameters, context, executemany):
+    context.span_start = time.perf_counter()
+
+def end_db_span(conn, cursor, statement, parameters, context, executemany):
+    record_span('db', context.span_start, time.perf_counter(), statement[:120])
+
+if ADMIN_TOKEN:
+    event.listen(engine, 'before_cursor_execute', start_db_span)
+    event.listen(engine, 'after_cursor_execute', end_db_span)
+
+# memory-mapped embeddings matrix
+os.makedirs(EMBEDDING_CACHE_DIR, exist_ok=True)
+embedding_file_name = os.path.join(EMBEDDING_CACHE_DIR, 'movies.embeddings.npy')
+
 def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+    # a lost race stops create_all at that table: run it again for the next ones
+    while not run_migration_ddl(lambda: SQLModel.metadata.create_all(engine)):
+        pass
+    add_missing_columns()
+
+def run_migration_ddl(run) -> bool:
+    '''
+    API replicas and workers migrate the shared database at the same time:
+    losing the race to create the same table / column / index is not an error.
+    Returns:
+        False when another process did it first.
+    '''
+    try:
+        run()
+        return True
+    except OperationalError as e:
+        if 'duplicate column name' not in str(e) and 'already exists' not in str(e):
+            raise
+        logging.info(f"Migration already applied by another process: {e.orig}")
+        return False
+
+def add_missing_columns():
+    '''
+    `create_all` never alters existing tables.
+    Add the columns (and their indexes) declared after movies.db was created, with their scalar default for existing rows.
+    '''
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            existing = {row[1] for row in conn.exec_driver_sql(f'PRAGMA table_info("{table.name}")')}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column.type.compile(dialect=engine.dialect)}'
+                default = column.default.arg if column.default is not None and column.default.is_scalar else None
+                if isinstance(default, bool):
+                    default = int(default)
+                if isinstance(default, (int, float)):
+                    ddl += f' DEFAULT {default}'
+                elif isinstance(default, str):
+                    ddl += " DEFAULT '{}'".format(default.replace("'", "''"))
+                if run_migration_ddl(lambda: conn.exec_driver_sql(ddl)):
+                    logging.info(f"Added column {table.name}.{column.name}")
+            # indexes of added columns (ex. analysis_pending) are not created by create_all either
+            for index in table.indexes:
+                run_migration_ddl(lambda: index.create(conn, checkfirst=True))
+
+# In-memory prefix index for type-ahead (title / director)
+suggest_index = SuggestIndex()
+suggest_sync_lock = threading.Lock()
+
+def build_suggest_index():
+    with Session(engine) as session:
+        # position first: changes racing with the load are applied again by the next sync
+        seq = latest_change_seq(session)
+        rows = session.exec(select(MoviesTable.id, MoviesTable.title, MoviesTable.director)).all()
+    suggest_index.build(rows, seq)
+    logging.info(f"Suggest index built: {len(rows)} movies, {len(suggest_index)} keys at seq {seq}")
+
+def sync_suggest_index():
+    '''
+    Same as `sync_catalog` for the suggest index: reload the title / director of movies changed since its position.
+    Called after every local write and periodically for writes of other processes.
+    '''
+    with suggest_sync_lock:
+        with Session(engine) as session:
+            state = session.get(ChangeLogStateTable, 1)
+            if state and suggest_index.seq < state.horizon:
+                build_suggest_index()
+                return
+            changes = session.exec(
+                select(ChangesTable.seq, ChangesTable.movie_id).where(ChangesTable.seq > suggest_index.seq).order_by(ChangesTable.seq)
+            ).all()
+            if not changes:
+                return
+            movie_ids = sorted({movie_id for _, movie_id in changes})
+            rows = {}
+            for start in range(0, len(movie_ids), SQLITE_IN_CHUNK):
+                chunk = movie_ids[start:start + SQLITE_IN_CHUNK]
+                rows.update((movie_id, (title, director)) for movie_id, title, director in session.exec(
+                    select(MoviesTable.id, MoviesTable.title, MoviesTable.director).where(MoviesTable.id.in_(chunk))
+                ).all())
+            for movie_id in movie_ids:
+                if movie_id in rows:
+                    suggest_index.update(movie_id, *rows[movie_id])
+                else:
+                    suggest_index.remove(movie_id)
+            suggest_index.seq = changes[-1][0]
+
+# Poster thumbnails; `image_cache.fetcher` can be swapped (ex. a local stand-in server in tests)
+image_cache = ImageCache(IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES, url_fetcher())
 
 # Dependancy setting
+# Columnar catalog snapshot, kept in sync with the change log
+catalog = CatalogSnapshot() if CATALOG_READ_ENGINE == 'columnar' else None
+catalog_sync_lock = threading.Lock()
+
+def reload_catalog():
+    with Session(engine) as session:
+        # position first: changes racing with the load are applied again by the next sync
+        seq = latest_change_seq(session)
+        movies = session.exec(select(MoviesTable)).all()
+        catalog.load(reshaping_movies(movies), seq)
+    logging.info(f"Catalog snapshot loaded: {len(catalog)} movies at seq {seq}")
+
+def sync_catalog():
+    '''
+    Apply the change log entries newer than the snapshot position (no-op when the engine is sqlite).
+    Called after every local write and periodically for writes of other processes.
+    '''
+    if catalog is None:
+        return
+    with catalog_sync_lock:
+        with Session(engine) as session:
+            state = session.get(ChangeLogStateTable, 1)
+            if state and catalog.seq < state.horizon:
+                reload_catalog()
+                return
+            changes = session.exec(
+                select(ChangesTable.seq, ChangesTable.movie_id).where(ChangesTable.seq > catalog.seq).order_by(ChangesTable.seq)
+            ).all()
+            if not changes:
+                return
+            movie_ids = sorted({movie_id for _, movie_id in changes})
+            movies = {movie.id: movie for movie in select_movies_by_ids(session, movie_ids)}
+            for movie_id in movie_ids:
+                if movie_id in movies:
+                    catalog.upsert(reshaping_movie(movies[movie_id]))
+                else:
+                    catalog.remove(movie_id)
+            catalog.seq = changes[-1][0]
+
+# Movie embeddings for `/movies/{id}/similar`, a memory-mapped cache of the movie_embeddings table
+embedding_index = EmbeddingIndex(embedding_file_name, dtype=EMBEDDING_DTYPE,
+                                 ann_min_movies=SIMILAR_ANN_MIN_MOVIES, ann_probes=SIMILAR_ANN_PROBES)
+embedding_sync_lock = threading.Lock()
+
+def reload_embeddings():
+    with Session(engine) as session:
+        seq = latest_change_seq(session)
+        rows = session.exec(select(MovieEmbeddingsTable.movie_id, MovieEmbeddingsTable.vector)).all()
+    if rows:
+        embedding_index.reset(len(decode_vector(rows[0][1])), capacity=max(1024, max(movie_id for movie_id, _ in rows) + 1))
+        for movie_id, vector in rows:
+            embedding_index.set(movie_id, decode_vector(vector))
+    embedding_index.flush(seq)
+    logging.info(f"Embedding matrix rebuilt: {len(embedding_index)} movies at seq {seq}")
+
+def sync_embeddings():
+    '''
+    Same as `sync_catalog` for the embedding matrix: reload the embeddings of movies changed since its position.
+    Called before every similarity query, so writes of workers are picked up too.
+    '''
+    with embedding_sync_lock:
+        with Session(engine) as session:
+            state = session.get(ChangeLogStateTable, 1)
+            if state and embedding_index.seq < state.horizon:
+                reload_embeddings()
+                return
+            changes = session.exec(
+                select(ChangesTable.seq, ChangesTable.movie_id).where(ChangesTable.seq > embedding_index.seq).order_by(ChangesTable.seq)
+            ).all()
+            if not changes:
+                return
+            movie_ids = sorted({movie_id for _, movie_id in changes})
+            vectors = {}
+            for start in range(0, len(movie_ids), SQLITE_IN_CHUNK):
+                chunk = movie_ids[start:start + SQLITE_IN_CHUNK]
+                vectors.update(session.exec(
+                    select(MovieEmbeddingsTable.movie_id, MovieEmbeddingsTable.vector).where(MovieEmbeddingsTable.movie_id.in_(chunk))
+                ).all())
+            for movie_id in movie_ids:
+                embedding_index.set(movie_id, decode_vector(vectors[movie_id]) if movie_id in vectors else None)
+            embedding_index.flush(changes[-1][0])
+
+async def sync_catalog_periodically():
+    '''Pick up the writes of other processes (API replicas, workers) in the in-memory indexes.'''
+    while True:
+        await asyncio.sleep(CATALOG_SYNC_SECONDS)
+        try:
+            await asyncio.to_thread(sync_suggest_index)
+            await asyncio.to_thread(sync_catalog)
+        except Exception as e:
+            logging.error(f"Catalog sync failed: {e}")
+
+# Single writer task for high-rate writes; its session keeps the written values after commit (no refresh SELECT).
+# It has its own engine: BEGIN IMMEDIATE + one SAVEPOINT per write, the other sessions keep pysqlite's transactions
+writer_engine = create_engine(sqlite_url, echo=False, connect_args=connect_args,)
+event.listen(writer_engine, 'connect', enable_wal)
+enable_savepoints(writer_engine)
+group_committer = GroupCommitter(lambda: Session(writer_engine, expire_on_commit=False),
+                                 max_batch=GROUP_COMMIT_MAX_BATCH, max_delay=GROUP_COMMIT_MAX_DELAY_MS / 1000)
+
 def get_session():
     with Session(engine) as session:
         yield session
@@ -44,11 +324,46 @@ SessionDep = Annotated[Session, Depends(get_session)]
 async def lifespan(app: FastAPI):
     logging.info("SERVICE UP!")
     create_db_and_tables()
+    mark_unanalyzed_pending()
+    build_suggest_index()
+    if not embedding_index.open():
+        reload_embeddings()
+    sync_embeddings()
+    group_committer.start()
+    background = [asyncio.create_task(compact_change_log_periodically()),
+                  asyncio.create_task(sync_catalog_periodically())]
+    if catalog is not None:
+        reload_catalog()
     yield
+    await group_committer.stop()
+    for task in background:
+        task.cancel()
     logging.info("SERVICE DOWN!")
 
 app = FastAPI(lifespan=lifespan)
 
+# Identical concurrent catalog reads (same path + query) share one execution
+coalescing_stats = CoalescingStats()
+
+def is_coalesced_read(scope) -> bool:
+    # a profiled request must run its own execution
+    if scope.get('profile'):
+        return False
+    return scope['path'] == '/movies' or scope['path'].startswith('/movies/')
+
+app.add_middleware(SingleFlightMiddleware, should_coalesce=is_coalesced_read, stats=coalescing_stats)
+
+# Request tracing and on-demand profiling (outermost, so it also sees the coalescing layer)
+slow_traces = SlowTraceBuffer(SLOW_TRACE_BUFFER)
+# without ADMIN_TOKEN nothing is traced: no middleware, no db span hooks
+if ADMIN_TOKEN:
+    app.add_middleware(ProfilingMiddleware, admin_token=ADMIN_TOKEN, slow_ms=SLOW_REQUEST_MS, buffer=slow_traces,
+                       interval=PROFILE_INTERVAL_MS / 1000)
+
+def require_admin(x_admin_token: Annotated[Optional[str], Header()] = None):
+    if not ADMIN_TOKEN or x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail='Admin token required')
+
 # DB Table Declaration
 class MoviesTable(SQLModel, table=True):
     '''Default Table Declaration'''
@@ -63,6 +378,39 @@ class MoviesTable(SQLModel, table=True):
 
     sentiment_raw: Optional[str] = Field(default=None, sa_column=Column("sentiment", Text))
 
+    # Aggregates over `reviews`, maintained on insert / scoring so reads never scan the reviews table
+    review_count: int = Field(default=0, description='Number of reviews')
+    sentiment_count: int = Field(default=0, description='Number of scored reviews')
+    positive_sum: float = Field(default=0.0, description='Sum of positive probability of scored reviews')
+
+    # Analysis work queue: set on review writes, cleared by the worker holding the lease
+    analysis_pending: bool = Field(default=False, index=True)
+    lease_owner: Optional[str] = Field(default=None, description='Worker currently analyzing this movie')
+    lease_expires_at: Optional[datetime] = Field(default=None)
+
+    @property
+    def sentiment(self) -> Optional[Dict[str, float]]:
+        if self.sentiment_raw:
+            try:
+                return json.loads(self.sentiment_raw)
+            except json.JSONDecodeError:
+                return None
+        return None
+
+    @sentiment.setter
+    def sentiment(self, value: Optional[Dict[str, float]]):
+        self.sentiment_raw = json.dumps(value) if value else None
+
+class ReviewsTable(SQLModel, table=True):
+    '''User reviews, many per movie'''
+    __tablename__ = "reviews"
+    id: Optional[int] = Field(default=None, primary_key=True)
+    movie_id: int = Field(foreign_key="movie_info.id", index=True, description='ID of the reviewed movie')
+    text: str = Field(sa_column=Column("text", Text, nullable=False))
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+    sentiment_raw: Optional[str] = Field(default=None, sa_column=Column("sentiment", Text))
+
     @property
     def sentiment(self) -> Optional[Dict[str, float]]:
         if self.sentiment_raw:
@@ -76,6 +424,36 @@ class MoviesTable(SQLModel, table=True):
     def sentiment(self, value: Optional[Dict[str, float]]):
         self.sentiment_raw = json.dumps(value) if value else None
 
+class ReviewTokensTable(SQLModel, table=True):
+    '''Token ids of reviews, so re-analysis skips tokenization'''
+    __tablename__ = "review_tokens"
+    review_hash: str = Field(description='sha1 of tokenizer name + review text', primary_key=True)
+    dtype: str = Field(description="array typecode of token_ids: 'h' (int16) or 'i' (int32)")
+    token_ids: bytes = Field(sa_column=Column("token_ids", LargeBinary, nullable=False))
+
+class MovieEmbeddingsTable(SQLModel, table=True):
+    '''Sum of the review embeddings of each movie, source of the similarity matrix'''
+    __tablename__ = "movie_embeddings"
+    movie_id: int = Field(foreign_key="movie_info.id", primary_key=True)
+    review_count: int = Field(default=0, description='reviews rows summed in vector; 0 = embedding of movie_info.review only')
+    vector: bytes = Field(sa_column=Column("vector", LargeBinary, nullable=False), description='float32 little-endian')
+
+class ChangesTable(SQLModel, table=True):
+    '''Change log of movie_info, read by `/movies/changes`'''
+    __tablename__ = "movie_changes"
+    # AUTOINCREMENT: seq is never reused, even after compaction deleted the newest rows
+    __table_args__ = {'sqlite_autoincrement': True}
+    seq: Optional[int] = Field(default=None, primary_key=True)
+    movie_id: int = Field(index=True)
+    op: str = Field(description="insert | update | delete | review | sentiment")
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class ChangeLogStateTable(SQLModel, table=True):
+    '''Single row: changes up to `horizon` may have been compacted away'''
+    __tablename__ = "movie_changes_state"
+    id: int = Field(default=1, primary_key=True)
+    horizon: int = Field(default=0)
+
 # Response Body Declaration
 class MovieResponse(BaseModel):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -86,6 +464,8 @@ class MovieResponse(BaseModel):
     image_url: Optional[str] = None
     review: Optional[str] = None
     predicted_sentiment: Optional[Dict[str, float]] = None
+    review_count: int = 0
+    sentiment_mean: Optional[float] = None
     
     model_config = {
         'json_schema_extra': {
@@ -96,7 +476,9 @@ class MovieResponse(BaseModel):
                 'rating': 4.5,
                 'image_url': 'https://image.com/poster.jpg',
                 'review': 'Great acting and story!',
-                'predicted_sentiment': {'positive': 0.95, 'negative': 0.05}
+                'predicted_sentiment': {'positive': 0.95, 'negative': 0.05},
+                'review_count': 3,
+                'sentiment_mean': 0.71
             }
         }
     }
@@ -107,6 +489,59 @@ class MovieCreate(BaseModel):
     director: str
     category: str
 
+# Review of the reviews table
+class ReviewResponse(BaseModel):
+    id: int
+    movie_id: int
+    text: str
+    created_at: datetime
+    sentiment: Optional[Dict[str, float]] = None
+
+class ReviewPage(BaseModel):
+    movie_id: int
+    total: int
+    items: List[ReviewResponse]
+    next_cursor: Optional[int] = None
+
+# Change feed
+class ChangeResponse(BaseModel):
+    seq: int
+    op: str
+    movie_id: int
+    # current state of the movie, None when it has been deleted
+    movie: Optional[MovieResponse] = None
+
+class ChangesPage(BaseModel):
+    changes: List[ChangeResponse]
+    next_since: int
+    has_more: bool
+
+# Catalog filters (exact match for the text fields)
+class CatalogFilter(BaseModel):
+    title: Optional[str] = None
+    director: Optional[str] = None
+    category: Optional[str] = None
+    min_rating: Optional[float] = None
+    max_rating: Optional[float] = None
+
+class CatalogQuery(CatalogFilter):
+    # descending, missing values last
+    sort_by: Optional[Literal['rating', 'sentiment', 'sentiment_mean', 'review_count']] = None
+    # top-k
+    k: Optional[int] = Field(default=None, ge=1, le=1000)
+
+# Type-ahead suggestion
+class SimilarMovieResponse(MovieResponse):
+    similarity: float
+
+class SuggestionResponse(BaseModel):
+    text: str
+    field: str
+    movie_id: int
+
+# SQLite limits the number of bound parameters per statement
+SQLITE_IN_CHUNK = 500
+
 # helper function
 def check_duplicate(session: Session, title: str, director: str, exclude_id: Optional[int] = None):
     '''
@@ -141,8 +576,417 @@ def reshaping_movie(movie: MoviesTable) -> MovieResponse:
         rating=movie.rating,
         image_url=movie.image_url,
         review=movie.review,
-        predicted_sentiment=sentiment_dict
+        predicted_sentiment=sentiment_dict,
+        review_count=movie.review_count or 0,
+        sentiment_mean=(movie.positive_sum / movie.sentiment_count) if movie.sentiment_count else None
+    )
+
+def reshaping_movies(movies: List[MoviesTable]) -> List[MovieResponse]:
+    with span('reshape', f'{len(movies)} movies'):
+        return [reshaping_movie(movie) for movie in movies]
+
+def reshaping_review(review: ReviewsTable) -> ReviewResponse:
+    return ReviewResponse(
+        id=review.id,
+        movie_id=review.movie_id,
+        text=review.text,
+        created_at=review.created_at,
+        sentiment=review.sentiment
+    )
+
+# Values of a movie whose reviews changed: back in the queue, and a running lease is voided
+PENDING_ANALYSIS = {'analysis_pending': True, 'lease_owner': None, 'lease_expires_at': None}
+
+def insert_review(session: Session, movie_id: int, text: str) -> ReviewsTable:
+    '''
+    Append a review, bump the movie's review count and log the change in the same transaction (caller commits).
+    '''
+    review = ReviewsTable(movie_id=movie_id, text=text)
+    session.add(review)
+    session.execute(
+        update(MoviesTable)
+        .where(MoviesTable.id == movie_id)
+        .values(review_count=MoviesTable.review_count + 1, **PENDING_ANALYSIS)
+    )
+    record_change(session, movie_id, 'review')
+    return review
+
+def apply_review_sentiment(session: Session, review: ReviewsTable, sentiment_dict: Dict[str, float]) -> bool:
+    '''
+    Store the sentiment of one review and update the movie aggregates by the difference only.
+    The write is a compare-and-set on the previous sentiment, so a review scored twice
+    (ex. by two workers after a lease expired) is only counted once.
+    Returns:
+        False if the review was changed by someone else in the meantime.
+    '''
+    previous = review.sentiment
+    previous_condition = ReviewsTable.sentiment_raw == None if review.sentiment_raw is None else ReviewsTable.sentiment_raw == review.sentiment_raw
+    result = session.execute(
+        update(ReviewsTable)
+        .where(ReviewsTable.id == review.id, previous_condition)
+        .values(sentiment_raw=json.dumps(sentiment_dict))
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        return False
+
+    count_delta = 0 if previous else 1
+    positive_delta = sentiment_dict['positive'] - (previous['positive'] if previous else 0.0)
+    session.execute(
+        update(MoviesTable)
+        .where(MoviesTable.id == review.movie_id)
+        .values(sentiment_count=MoviesTable.sentiment_count + count_delta,
+                positive_sum=MoviesTable.positive_sum + positive_delta)
+    )
+    return True
+
+def add_review_embedding(session: Session, movie_id: int, vector: List[float]):
+    '''
+    Add the embedding of a newly scored `reviews` row to the movie vector (a sum: cosine similarity ignores the scale).
+    Must run after the review sentiment UPDATE, which holds the DB write lock for this read-modify-write.
+    '''
+    row = session.get(MovieEmbeddingsTable, movie_id)
+    if row is None:
+        row = MovieEmbeddingsTable(movie_id=movie_id, review_count=0, vector=b'')
+    if row.review_count == 0:
+        # the first reviews row replaces the embedding of the legacy single review
+        row.vector = encode_vector(vector)
+    else:
+        row.vector = encode_vector(decode_vector(row.vector) + np.asarray(vector, dtype=np.float32))
+    row.review_count += 1
+    session.add(row)
+
+def set_review_embedding(session: Session, movie_id: int, vector: List[float]):
+    '''
+    Embedding of `movie_info.review`, only used by movies without any scored `reviews` row.
+    '''
+    row = session.get(MovieEmbeddingsTable, movie_id)
+    if row is None:
+        session.add(MovieEmbeddingsTable(movie_id=movie_id, review_count=0, vector=encode_vector(vector)))
+    elif row.review_count == 0:
+        row.vector = encode_vector(vector)
+        session.add(row)
+
+def record_change(session: Session, movie_id: int, op: str):
+    '''
+    Append to the change log in the caller's transaction, so the entry commits (or not) with the change itself.
+    '''
+    session.add(ChangesTable(movie_id=movie_id, op=op))
+
+def latest_change_seq(session: Session) -> int:
+    return session.exec(select(func.max(ChangesTable.seq))).one() or 0
+
+def compact_change_log():
+    '''
+    Keep the log bounded:
+    - only the newest entry of each movie is kept (a client only needs to know that a movie changed after `since`),
+    - only the newest CHANGE_LOG_TOMBSTONES deletes are kept; clients older than the removed ones must resync.
+    '''
+    with Session(engine) as session:
+        latest_per_movie = select(func.max(ChangesTable.seq)).group_by(ChangesTable.movie_id)
+        superseded = session.execute(delete(ChangesTable).where(ChangesTable.seq.not_in(latest_per_movie))).rowcount
+
+        old_tombstones = (
+            select(ChangesTable.seq)
+            .where(ChangesTable.op == 'delete')
+            .order_by(ChangesTable.seq.desc())
+            .offset(CHANGE_LOG_TOMBSTONES)
+        )
+        horizon = session.exec(select(func.max(ChangesTable.seq)).where(ChangesTable.seq.in_(old_tombstones))).one()
+        if horizon:
+            session.execute(delete(ChangesTable).where(ChangesTable.op == 'delete', ChangesTable.seq <= horizon))
+            state = session.get(ChangeLogStateTable, 1) or ChangeLogStateTable(id=1)
+            state.horizon = max(state.horizon, horizon)
+            session.add(state)
+        session.commit()
+    if superseded or horizon:
+        logging.info(f"Change log compacted: {superseded} superseded entries, horizon {horizon or 0}")
+
+async def compact_change_log_periodically():
+    while True:
+        try:
+            await asyncio.to_thread(compact_change_log)
+        except Exception as e:
+            logging.error(f"Change log compaction failed: {e}")
+        await asyncio.sleep(CHANGE_LOG_COMPACT_SECONDS)
+
+def query_catalog(session: Session, sort_by: Optional[str] = None, k: Optional[int] = None, **filters) -> List[MovieResponse]:
+    '''
+    Filter / sort / top-k over the catalog.
+    Served by the columnar snapshot when enabled (no DB access), otherwise by SQLite.
+    '''
+    if catalog is not None:
+        return catalog.query(sort_by=sort_by, k=k, **filters)
+
+    conditions = []
+    for field in ('title', 'director', 'category'):
+        if filters.get(field):
+            conditions.append(getattr(MoviesTable, field) == filters[field])
+    if filters.get('min_rating') is not None:
+        conditions.append(MoviesTable.rating >= filters['min_rating'])
+    if filters.get('max_rating') is not None:
+        conditions.append(MoviesTable.rating <= filters['max_rating'])
+    movies = reshaping_movies(session.exec(select(MoviesTable).where(*conditions).order_by(MoviesTable.id)).all())
+
+    if sort_by is not None:
+        def sort_value(movie: MovieResponse) -> float:
+            value = (movie.predicted_sentiment or {}).get('positive') if sort_by == 'sentiment' else getattr(movie, sort_by)
+            return float('-inf') if value is None else value
+        movies.sort(key=lambda movie: (-sort_value(movie), movie.id))
+    return movies[:k] if k is not None else movies
+
+def count_catalog(session: Session, **filters) -> int:
+    if catalog is not None:
+        return catalog.count(**filters)
+    return len(query_catalog(session, **filters))
+
+def select_movies_by_ids(session: Session, movie_ids: List[int]) -> List[MoviesTable]:
+    movies = []
+    for start in range(0, len(movie_ids), SQLITE_IN_CHUNK):
+        chunk = movie_ids[start:start + SQLITE_IN_CHUNK]
+        movies.extend(session.exec(select(MoviesTable).where(MoviesTable.id.in_(chunk))).all())
+    return sorted(movies, key=lambda movie: movie.id)
+
+def tokenize_reviews(session: Session, texts: List[str]) -> List[List[int]]:
+    '''
+    Token ids (without special tokens) of each text.
+    Ids are read from `review_tokens` when cached; only unseen reviews are tokenized and then persisted.
+    The new rows are committed right away in their own short transaction: the caller runs the model next,
+    and SQLite would otherwise hold its single write lock through the whole inference.
+    '''
+    hashes = [review_hash(TOKENIZER_NAME, text) for text in texts]
+    unique_hashes = list(dict.fromkeys(hashes))
+
+    cached: Dict[str, List[int]] = {}
+    for start in range(0, len(unique_hashes), SQLITE_IN_CHUNK):
+        chunk = unique_hashes[start:start + SQLITE_IN_CHUNK]
+        rows = session.exec(select(ReviewTokensTable).where(ReviewTokensTable.review_hash.in_(chunk))).all()
+        for row in rows:
+            cached[row.review_hash] = decode_token_ids(row.dtype, row.token_ids)
+
+    missing = {}
+    for text, text_hash in zip(texts, hashes):
+        if text_hash not in cached and text_hash not in missing:
+            missing[text_hash] = text
+    if missing:
+        missing_ids = tokenizer(list(missing.values()), add_special_tokens=False)['input_ids']
+        new_rows = []
+        for text_hash, ids in zip(missing.keys(), missing_ids):
+            cached[text_hash] = list(ids)
+            dtype, blob = encode_token_ids(ids)
+            new_rows.append({'review_hash': text_hash, 'dtype': dtype, 'token_ids': blob})
+        # another request may have cached the same review in the meantime
+        with Session(engine) as cache_session:
+            cache_session.execute(insert(ReviewTokensTable).prefix_with('OR IGNORE'), new_rows)
+            cache_session.commit()
+        logging.info(f"Tokenized {len(missing)} reviews, {len(unique_hashes) - len(missing)} from cache")
+
+    return [cached[text_hash] for text_hash in hashes]
+
+def score_reviews(session: Session, reviews: Dict[Hashable, str]) -> Tuple[Dict[Hashable, List[float]], Dict[Hashable, List[float]]]:
+    '''
+    Run the sentiment model over many reviews at once.
+    Reviews are split into overlapping windows (no truncation at 512 tokens),
+    bucketed by length and batched up to `REVIEW_TOKEN_BUDGET` padded tokens.
+    Args:
+        session: used for the token id cache.
+        reviews: review text keyed by any identifier (ex. movie id).
+    Returns:
+        (scores, embeddings): class probabilities and the mean-pooled last hidden state for each key,
+        both averaged over the windows of the review. The embeddings come from the same forward pass.
+        Keys with the same text (ex. `movie_info.review` and its `reviews` row) are scored once and share the result.
+    '''
+    if not reviews:
+        return {}, {}
+    # text -> keys holding it; the windows are keyed by the index of the distinct text
+    keys_by_text: Dict[str, List[Hashable]] = {}
+    for key, text in reviews.items():
+        keys_by_text.setdefault(text, []).append(key)
+    texts = list(keys_by_text)
+    keys = range(len(texts))
+    with span('tokenize', f'{len(texts)} reviews'):
+        token_ids = tokenize_reviews(session, texts)
+
+    windows = []
+    for key, ids in zip(keys, token_ids):
+        windows.extend(split_windows(key, ids, tokenizer.cls_token_id, tokenizer.sep_token_id,
+                                     max_length=REVIEW_MAX_LENGTH, stride=REVIEW_WINDOW_STRIDE))
+
+    scored_windows = []
+    window_scores = []
+    window_embeddings = []
+    pad_id = tokenizer.pad_token_id or 0
+    for batch in build_batches(windows, REVIEW_TOKEN_BUDGET):
+        max_len = max(window.length for window in batch)
+        input_ids = torch.full((len(batch), max_len), pad_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(batch), max_len), dtype=torch.long)
+        for row, window in enumerate(batch):
+            input_ids[row, :window.length] = torch.tensor(window.input_ids, dtype=torch.long)
+            attention_mask[row, :window.length] = 1
+
+        with torch.inference_mode(), span('forward', f'{len(batch)}x{max_len}'):
+            mask = attention_mask.to(device)
+            # one encoder pass for both outputs, without keeping the activations of every layer:
+            # the classification head reads the pooled [CLS] output (dropout is a no-op in eval mode)
+            outputs = model.bert(input_ids=input_ids.to(device), attention_mask=mask)
+            logits = model.classifier(outputs.pooler_output)
+            # mean over the real (non padding) tokens of the last layer
+            mask = mask.unsqueeze(-1).to(outputs.last_hidden_state.dtype)
+            pooled = (outputs.last_hidden_state * mask).sum(dim=1) / mask.sum(dim=1)
+        window_scores.extend(logits.softmax(dim=1).cpu().tolist())
+        window_embeddings.extend(pooled.float().cpu().tolist())
+        scored_windows.extend(batch)
+
+    text_scores = aggregate_scores(scored_windows, window_scores)
+    text_embeddings = aggregate_scores(scored_windows, window_embeddings)
+    scores, embeddings = {}, {}
+    for index, text in enumerate(texts):
+        for key in keys_by_text[text]:
+            scores[key] = text_scores[index]
+            embeddings[key] = text_embeddings[index]
+    return scores, embeddings
+
+def mark_unanalyzed_pending():
+    '''
+    Queue movies whose review or `reviews` rows were never scored (ex. rows written before the queue existed),
+    and reviewed movies without embedding (scored before embeddings were stored).
+    '''
+    with Session(engine) as session:
+        session.execute(
+            update(MoviesTable)
+            .where(MoviesTable.analysis_pending == False,
+                   or_(and_(MoviesTable.review != None, MoviesTable.sentiment_raw == None),
+                       and_(MoviesTable.review != None, MoviesTable.id.not_in(select(MovieEmbeddingsTable.movie_id))),
+                       MoviesTable.id.in_(select(ReviewsTable.movie_id).where(ReviewsTable.sentiment_raw == None))))
+            .values(analysis_pending=True)
+            .execution_options(synchronize_session=False)
+        )
+        session.commit()
+
+def count_pending_analysis(session: Session) -> int:
+    return session.exec(select(func.count()).select_from(MoviesTable).where(MoviesTable.analysis_pending == True)).one()
+
+# movies the analysis endpoints work on: a legacy review or rows in `reviews`
+HAS_REVIEWS = or_(MoviesTable.review != None, MoviesTable.review_count > 0)
+
+def require_reviews(session: Session):
+    '''
+    Raise 404 when no movie has a review to analyze.
+    '''
+    if not session.exec(select(MoviesTable.id).where(HAS_REVIEWS).limit(1)).first():
+        raise HTTPException(status_code=404, detail='No reviews found for analysis')
+
+def claim_analysis_chunk(session: Session, limit: int) -> Tuple[str, List[int]]:
+    '''
+    Atomically lease up to `limit` pending movies that are not leased (or whose lease expired).
+    The claim is a single UPDATE, so concurrent replicas / workers never get the same rows.
+    Returns:
+        (lease_owner, movie_ids): the lease token of this claim and the claimed movie ids (empty when nothing is left).
+    '''
+    lease_owner = f"{WORKER_ID}/{uuid.uuid4().hex[:12]}"
+    now = datetime.now(timezone.utc)
+    claimable = (
+        select(MoviesTable.id)
+        .where(MoviesTable.analysis_pending == True,
+               or_(MoviesTable.lease_expires_at == None, MoviesTable.lease_expires_at < now))
+        .order_by(MoviesTable.id)
+        .limit(limit)
     )
+    session.execute(
+        update(MoviesTable)
+        .where(MoviesTable.id.in_(claimable))
+        .values(lease_owner=lease_owner, lease_expires_at=now + timedelta(seconds=ANALYZE_LEASE_SECONDS))
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    movie_ids = session.exec(select(MoviesTable.id).where(MoviesTable.lease_owner == lease_owner)).all()
+    return lease_owner, sorted(movie_ids)
+
+def release_leases(session: Session, lease_owner: str):
+    '''
+    Give back the movies of a failed claim right away instead of waiting for the lease to expire.
+    '''
+    session.execute(
+        update(MoviesTable)
+        .where(MoviesTable.lease_owner == lease_owner)
+        .values(lease_owner=None, lease_expires_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+
+def analyze_movies(session: Session, movie_ids: List[int], lease_owner: str) -> List[MoviesTable]:
+    '''
+    Score the review of the leased movies and their unscored `reviews` rows in one batched pass, then commit.
+    Results are only written for movies still leased by `lease_owner`; a movie whose lease was lost
+    (expired and reclaimed, or its review rewritten meanwhile) stays pending for the next claim.
+    Returns:
+        List[MoviesTable]: the analyzed movies, reloaded with their new aggregates.
+    '''
+    movies = select_movies_by_ids(session, movie_ids)
+    pending_reviews = []
+    with_embedding = set()
+    for start in range(0, len(movie_ids), SQLITE_IN_CHUNK):
+        chunk = movie_ids[start:start + SQLITE_IN_CHUNK]
+        pending_reviews.extend(session.exec(
+            select(ReviewsTable).where(ReviewsTable.movie_id.in_(chunk), ReviewsTable.sentiment_raw == None)
+        ).all())
+        with_embedding.update(session.exec(
+            select(MovieEmbeddingsTable.movie_id).where(MovieEmbeddingsTable.movie_id.in_(chunk))
+        ).all())
+
+    # `sentiment` is reset on every review rewrite: a scored review with an embedding is not scored again
+    rescored = {movie.id for movie in movies
+                if movie.review is not None and (movie.sentiment_raw is None or movie.id not in with_embedding)}
+    texts = {('movie', movie.id): movie.review for movie in movies if movie.id in rescored}
+    texts.update({('review', review.id): review.text for review in pending_reviews})
+    scores, embeddings = score_reviews(session, texts)
+
+    changed_ids = set()
+    for movie in movies:
+        # first write of this transaction: the DB write lock is only taken once scoring is done
+        result = session.execute(
+            update(MoviesTable)
+            .where(MoviesTable.id == movie.id, MoviesTable.lease_owner == lease_owner)
+            .values(analysis_pending=False, lease_owner=None, lease_expires_at=None)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1 and movie.id in rescored:
+            probs = scores[('movie', movie.id)]
+            sentiment_dict = {'positive': float(probs[1]), 'negative': float(probs[0])}
+            movie.sentiment = json.dumps(sentiment_dict)
+            session.add(movie)
+            set_review_embedding(session, movie.id, embeddings[('movie', movie.id)])
+            changed_ids.add(movie.id)
+
+    for review in pending_reviews:
+        probs = scores[('review', review.id)]
+        if apply_review_sentiment(session, review, {'positive': float(probs[1]), 'negative': float(probs[0])}):
+            add_review_embedding(session, review.movie_id, embeddings[('review', review.id)])
+            changed_ids.add(review.movie_id)
+
+    for movie_id in sorted(changed_ids):
+        record_change(session, movie_id, 'sentiment')
+    session.commit()
+
+    # one SELECT reloads the committed rows with their new aggregates
+    return select_movies_by_ids(session, movie_ids)
+
+def process_analysis_chunk(session: Session, limit: int = ANALYZE_CHUNK_SIZE) -> Optional[List[MoviesTable]]:
+    '''
+    Claim one chunk of pending movies and analyze it.
+    Returns:
+        the analyzed movies, or None when there is nothing left to claim.
+    '''
+    lease_owner, movie_ids = claim_analysis_chunk(session, limit)
+    if not movie_ids:
+        return None
+    try:
+        return analyze_movies(session, movie_ids, lease_owner)
+    except Exception:
+        session.rollback()
+        release_leases(session, lease_owner)
+        raise
+
 # health check
 @app.get("/health", tags=["Health"])
 def health_check(session: SessionDep):
@@ -162,6 +1006,23 @@ def health_check(session: SessionDep):
         logging.error(f"Health check failed: {e}")
         return JSONResponse(status_code=503, content={"status": "error", "model": "unknown", "db": "disconnected"})
 
+@app.get('/metrics/coalescing', tags=["Health"])
+def coalescing_metrics():
+    '''
+    Counters of the single-flight layer: `collapsed` requests were answered with the result of an identical in-flight request.
+    '''
+    return coalescing_stats.as_dict()
+
+@app.get('/debug/slow', tags=["Health"], dependencies=[Depends(require_admin)])
+def slow_requests():
+    '''
+    Most recent requests slower than `SLOW_REQUEST_MS`, newest first, with their spans
+    (db statements, reshape, tokenize, forward) in ms from the start of the request.
+    Profile a single request with `X-Profile: 1` (or `?profile=1`): the response is then a folded-stack
+    profile for flamegraph.pl / speedscope. Both need the `X-Admin-Token` header.
+    '''
+    return {'threshold_ms': SLOW_REQUEST_MS, 'traces': slow_traces.recent()}
+
 # Backend entry point
 @app.get('/', description='Hello!', response_description='Welcome!')
 async def root():
@@ -170,26 +1031,37 @@ async def root():
     '''
     return {"messages": "HI! This website is for Movie search and estimate movie rates by reviews"}
 
+# Read endpoints are plain `def` (threadpool): the event loop stays free, so identical concurrent reads can be collapsed
 # Get all the movie data from DB
 @app.get('/movies', response_model=List[MovieResponse], description='List of Movies', response_description='All items in DB')
-async def get_all_movies(session: SessionDep):
+def get_all_movies(session: SessionDep, response: Response):
     '''
     Get a list of all movies in the DB.
+    The `X-Change-Seq` header holds the change log position of this snapshot, to continue with `/movies/changes?since=`.
     Args:
         session (SessionDep): SQLModel session dependency.
     Returns:
         List[MovieResponse]: List of all movies (if available).
     '''
+    if catalog is not None:
+        response.headers['X-Change-Seq'] = str(catalog.seq)
+        movies = catalog.query()
+        if not movies:
+            raise HTTPException(status_code=404, detail='No movies found')
+        return movies
+
+    # read before the movies: a change racing with this request is replayed (harmless) rather than missed
+    response.headers['X-Change-Seq'] = str(latest_change_seq(session))
     movies = session.exec(select(MoviesTable)).all()
 
     if not movies:
         raise HTTPException(status_code=404, detail='No movies found')
 
-    return [reshaping_movie(movie) for movie in movies]
+    return reshaping_movies(movies)
 
 # Search from DB
-@app.get('/movies/title/{movie_title}', response_model=List[MovieResponse], response_model_exclude=['id'])
-async def get_title(session: SessionDep, movie_title: Annotated[str, Path(description="Input the movie title that you looking for!")]):
+@app.get('/movies/title/{movie_title}', response_model=List[MovieResponse])
+def get_title(session: SessionDep, movie_title: Annotated[str, Path(description="Input the movie title that you looking for!")]):
     '''
     take `movie_tile` as a input variable and return the correspond infos form DB
     Args:
@@ -205,13 +1077,13 @@ async def get_title(session: SessionDep, movie_title: Annotated[str, Path(descri
         if not movies:
             raise HTTPException(status_code=404, detail='No movies found')
         
-        return [reshaping_movie(movie) for movie in movies]
+        return reshaping_movies(movies)
 
     raise HTTPException(status_code=404, detail=f"NO MATCHING MOVIE FOUND!: {movie_title}")
     
 
-@app.get('/movies/director/{movie_director}', response_model=List[MovieResponse], response_model_exclude=['id'])
-async def get_director(session: SessionDep, movie_director: Annotated[str, Path(description='Search Query')]):
+@app.get('/movies/director/{movie_director}', response_model=List[MovieResponse])
+def get_director(session: SessionDep, movie_director: Annotated[str, Path(description='Search Query')]):
     '''
     take `direcor` as a input variable and return the correspond infos form DB.
     Args:
@@ -227,12 +1099,12 @@ async def get_director(session: SessionDep, movie_director: Annotated[str, Path(
         if not movies:
             raise HTTPException(status_code=404, detail='No movies found')
         
-        return [reshaping_movie(movie) for movie in movies]
+        return reshaping_movies(movies)
     
     raise HTTPException(status_code=404, detail=f'NO MATCHING DIRECTOR FOUND!: {movie_director}')
 
-@app.get('/movies/search', response_model=List[MovieResponse], response_model_exclude=['id'])
-async def get_mult_query(session: SessionDep,
+@app.get('/movies/search', response_model=List[MovieResponse])
+def get_mult_query(session: SessionDep,
                         title: Annotated[str, Query(description='title')],
                         director: Annotated[str, Query(description='title')],
                         category: Annotated[str, Query(description='title')]
@@ -257,6 +1129,11 @@ async def get_mult_query(session: SessionDep,
     if not conditions:
         raise HTTPException(status_code=400, detail='At least one query parameter must be provided')
 
+    if catalog is not None:
+        movies = catalog.query(title=title, director=director, category=category)
+        if not movies:
+            raise HTTPException(status_code=404, detail='No matching movies found')
+        return movies
     
     statement = select(MoviesTable).where(and_(*conditions))
 
@@ -265,7 +1142,77 @@ async def get_mult_query(session: SessionDep,
     if not movies:
         raise HTTPException(status_code=404, detail='No matching movies found')
 
-    return [reshaping_movie(movie) for movie in movies]
+    return reshaping_movies(movies)
+
+@app.get('/movies/filter', response_model=List[MovieResponse])
+def filter_movies(session: SessionDep, params: Annotated[CatalogQuery, Query()]):
+    '''
+    Multi-field filter with optional top-k, ex. `/movies/filter?category=액션&min_rating=7&sort_by=sentiment&k=5`.
+    Text fields are exact matches, ratings are inclusive bounds, `sort_by` sorts descending (missing values last)
+    and `k` keeps the first k.
+    Returns:
+        List[MovieResponse]: matching movies (can be empty).
+    '''
+    return query_catalog(session, **params.model_dump())
+
+@app.get('/movies/count')
+def count_movies(session: SessionDep, filters: Annotated[CatalogFilter, Query()]):
+    '''
+    Number of movies matching the filters of `/movies/filter`.
+    '''
+    return {"count": count_catalog(session, **filters.model_dump())}
+
+@app.get('/movies/changes', response_model=ChangesPage)
+def get_changes(session: SessionDep,
+                      since: Annotated[int, Query(ge=0, description='Last seq already applied (`X-Change-Seq` of GET /movies, or `next_since`)')] = 0,
+                      limit: Annotated[int, Query(ge=1, le=1000, description='Maximum number of changes')] = 200
+                      ):
+    '''
+    Changes of the catalog after `since`, oldest first, with the current state of each changed movie.
+    Clients apply the page (replace / remove movies) and continue with `next_since` while `has_more` is true.
+    Returns 410 when `since` is older than the compacted part of the log: the client must reload GET /movies.
+    '''
+    state = session.get(ChangeLogStateTable, 1)
+    if state and since < state.horizon:
+        raise HTTPException(status_code=410, detail=f'Changes before seq {state.horizon} were compacted, reload /movies')
+
+    changes = session.exec(
+        select(ChangesTable).where(ChangesTable.seq > since).order_by(ChangesTable.seq).limit(limit + 1)
+    ).all()
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    movies = {movie.id: movie for movie in select_movies_by_ids(session, sorted({change.movie_id for change in changes}))}
+    return ChangesPage(
+        changes=[
+            ChangeResponse(
+                seq=change.seq,
+                op=change.op,
+                movie_id=change.movie_id,
+                movie=reshaping_movie(movies[change.movie_id]) if change.movie_id in movies else None
+            )
+            for change in changes
+        ],
+        next_since=changes[-1].seq if changes else since,
+        has_more=has_more
+    )
+
+@app.get('/movies/suggest', response_model=List[SuggestionResponse])
+async def suggest_movies(prefix: Annotated[str, Query(min_length=1, description='Partial title or director name (choseong like "ㅂㅈㄷㅅ" is allowed)')],
+                         limit: Annotated[int, Query(ge=1, le=50, description='Maximum number of suggestions')] = 10,
+                         field: Annotated[Optional[str], Query(pattern='^(title|director)$', description='Restrict to title or director')] = None
+                         ):
+    '''
+    Prefix autocomplete over titles and director names.
+    Served from the in-memory index, so it never touches the DB.
+    Args:
+        prefix: user input typed so far.
+        limit: maximum number of suggestions.
+        field: `title` or `director` to restrict the suggestions.
+    Returns:
+        List[SuggestionResponse]: distinct matching titles / director names (can be empty).
+    '''
+    return suggest_index.suggest(prefix, limit=limit, field=field)
 
 # Add new movie data to DB
 @app.post('/movies', response_model=MovieResponse, status_code=201)
@@ -286,14 +1233,18 @@ async def create_movie(session: SessionDep, new_movie: MovieCreate = Body(descri
     
     db_movie = MoviesTable(**new_movie.model_dump())
     session.add(db_movie)
+    # flush assigns the id needed by the change log entry
+    session.flush()
+    record_change(session, db_movie.id, 'insert')
     session.commit()
     session.refresh(db_movie)
+    await asyncio.to_thread(sync_suggest_index)
+    await asyncio.to_thread(sync_catalog)
 
     return MovieResponse(**db_movie.dict(), predicted_sentiment=None)
 
 @app.put('/movies/{movie_id}', response_model=MovieResponse)
-async def update_movie_by_id(session: SessionDep,
-                       movie_id: Annotated[int, Path(description='ID of the movie to update')],
+async def update_movie_by_id(movie_id: Annotated[int, Path(description='ID of the movie to update')],
                        updated_movie: MovieResponse = Body(description='Updated movie information')
                        ):
     '''
@@ -304,27 +1255,42 @@ async def update_movie_by_id(session: SessionDep,
     Returns:
         MovieResponse: movies correspond to the user inputs (if available).
     '''
-    movie = session.get(MoviesTable, movie_id)
-    if not movie:
-        raise HTTPException(status_code=404, detail=f'Movie with ID {movie_id} not found')
+    update_data = updated_movie.model_dump(exclude_unset=True)
+    update_data.pop("predicted_sentiment", None)
+    # aggregates are maintained by the reviews endpoints only
+    update_data.pop("review_count", None)
+    update_data.pop("sentiment_mean", None)
 
-    # Check for duplicate title and director excluding current movie
-    existing_movie = check_duplicate(session, updated_movie.title, updated_movie.director, exclude_id=movie_id)
+    def write(session: Session) -> MovieResponse:
+        movie = session.get(MoviesTable, movie_id)
+        if not movie:
+            raise HTTPException(status_code=404, detail=f'Movie with ID {movie_id} not found')
 
-    if existing_movie:
-        raise HTTPException(status_code=409, detail='Another movie with the same title and director already exists')
+        # Check for duplicate title and director excluding current movie
+        existing_movie = check_duplicate(session, updated_movie.title, updated_movie.director, exclude_id=movie_id)
 
-    update_data = updated_movie.model_dump(exclude_unset=True)
-    update_data.pop("predicted_sentiment", None)
+        if existing_movie:
+            raise HTTPException(status_code=409, detail='Another movie with the same title and director already exists')
 
-    for key, value in update_data.items():
-        setattr(movie, key, value)
+        values = dict(update_data)
+        if 'review' in values and values['review'] != movie.review:
+            # the sentiment of the previous review no longer applies
+            values.update(PENDING_ANALYSIS, sentiment_raw=None)
 
-    session.add(movie)
-    session.commit()
-    session.refresh(movie)
+        for key, value in values.items():
+            setattr(movie, key, value)
+
+        session.add(movie)
+        record_change(session, movie.id, 'update')
+        session.flush()
+        return reshaping_movie(movie)
+
+    # committed together with the other queued writes
+    movie = await group_committer.submit(write)
+    await asyncio.to_thread(sync_suggest_index)
+    await asyncio.to_thread(sync_catalog)
 
-    return reshaping_movie(movie)
+    return movie
 
 @app.delete('/movies/{movie_id}', status_code=204)
 async def delete_movie_by_id(session: SessionDep, movie_id: Annotated[int, Path(description='ID of the movie to delete')]):
@@ -337,71 +1303,228 @@ async def delete_movie_by_id(session: SessionDep, movie_id: Annotated[int, Path(
     if not movie:
         raise HTTPException(status_code=404, detail=f'Movie with ID {movie_id} not found')
 
+    session.execute(delete(ReviewsTable).where(ReviewsTable.movie_id == movie_id))
+    session.execute(delete(MovieEmbeddingsTable).where(MovieEmbeddingsTable.movie_id == movie_id))
     session.delete(movie)
+    record_change(session, movie_id, 'delete')
     session.commit()
+    await asyncio.to_thread(sync_suggest_index)
+    await asyncio.to_thread(sync_catalog)
 
     return {"messages": f"Movie with ID {movie_id} has been deleted"}
 
 @app.post('/movies/{movie_id}/review', response_model=MovieResponse)
-async def add_review(session: SessionDep, 
-                     movie_id: Annotated[int, Path(description='ID of the movie to update')],
+async def add_review(movie_id: Annotated[int, Path(description='ID of the movie to update')],
                      review_string: Annotated[str, Body(description='Movie review text for sentiment analysis')]
                      ):
     '''
     Add or update a review for a specific movie.
 
     Performs DB update only; sentiment analysis must be triggered separately.
+    A new text is also appended to the movie's reviews; resubmitting the current review changes nothing.
+    The write is group-committed with the other queued writes.
     '''
     if not review_string:
         raise HTTPException(status_code=400, detail='Review text is required')
-    
-    # add review to DB
+
+    def write(session: Session) -> MovieResponse:
+        # add review to DB
+        movie = session.get(MoviesTable, movie_id)
+        if not movie:
+            raise HTTPException(status_code=404, detail=f'Movie with ID {movie_id} not found')
+        if movie.review == review_string:
+            # the same review submitted again (ex. the update page re-saving it): nothing to write
+            return reshaping_movie(movie)
+        # the sentiment of the previous review no longer applies
+        movie.review = review_string
+        movie.sentiment_raw = None
+        session.add(movie)
+        # keep the history as well, `review` only holds the latest one
+        # (its review_count / pending UPDATE is mirrored on `movie` by the session, no refresh needed)
+        insert_review(session, movie_id, review_string)
+        session.flush()
+        return reshaping_movie(movie)
+
+    movie = await group_committer.submit(write)
+    await asyncio.to_thread(sync_catalog)
+    return movie
+
+@app.post('/movies/{movie_id}/reviews', response_model=ReviewResponse, status_code=201)
+async def create_review(movie_id: Annotated[int, Path(description='ID of the reviewed movie')],
+                        review_string: Annotated[str, Body(description='Movie review text')]
+                        ):
+    '''
+    Append a review to the movie without touching its other reviews.
+    The movie's review count is incremented in the same transaction; sentiment is added by `/movies/review_analyze`.
+    The write is group-committed with the other queued writes.
+    '''
+    if not review_string:
+        raise HTTPException(status_code=400, detail='Review text is required')
+
+    def write(session: Session) -> ReviewResponse:
+        if not session.get(MoviesTable, movie_id):
+            raise HTTPException(status_code=404, detail=f'Movie with ID {movie_id} not found')
+        review = insert_review(session, movie_id, review_string)
+        # assigns the review id, no refresh SELECT after commit
+        session.flush()
+        return reshaping_review(review)
+
+    review = await group_committer.submit(write)
+    await asyncio.to_thread(sync_catalog)
+    return review
+
+@app.get('/movies/{movie_id}/reviews', response_model=ReviewPage)
+def list_reviews(session: SessionDep,
+                       movie_id: Annotated[int, Path(description='ID of the reviewed movie')],
+                       limit: Annotated[int, Query(ge=1, le=100, description='Page size')] = 20,
+                       cursor: Annotated[Optional[int], Query(description='`next_cursor` of the previous page')] = None
+                       ):
+    '''
+    List reviews of a movie, newest first.
+    Keyset pagination on the review id (index on movie_id), so deep pages cost the same as the first one.
+    Returns:
+        ReviewPage: reviews of this page, total count and the cursor of the next page (None on the last page).
+    '''
     movie = session.get(MoviesTable, movie_id)
     if not movie:
         raise HTTPException(status_code=404, detail=f'Movie with ID {movie_id} not found')
-    movie.review = review_string
 
-    session.add(movie)
-    session.commit()
-    session.refresh(movie)
-    return reshaping_movie(movie)
+    statement = select(ReviewsTable).where(ReviewsTable.movie_id == movie_id)
+    if cursor is not None:
+        statement = statement.where(ReviewsTable.id < cursor)
+    reviews = session.exec(statement.order_by(ReviewsTable.id.desc()).limit(limit + 1)).all()
+
+    next_cursor = reviews[limit - 1].id if len(reviews) > limit else None
+    return ReviewPage(
+        movie_id=movie_id,
+        total=movie.review_count or 0,
+        items=[reshaping_review(review) for review in reviews[:limit]],
+        next_cursor=next_cursor
+    )
+
+@app.get('/movies/{movie_id}/similar', response_model=List[SimilarMovieResponse])
+def get_similar_movies(session: SessionDep,
+                       movie_id: Annotated[int, Path(description='ID of the reference movie')],
+                       k: Annotated[int, Query(ge=1, le=100, description='Number of similar movies')] = 10
+                       ):
+    '''
+    Movies whose reviews read the most alike: cosine similarity of the review embeddings
+    stored by the sentiment analysis (no extra model call).
+    Returns:
+        List[SimilarMovieResponse]: up to k movies, most similar first.
+    '''
+    movie = session.get(MoviesTable, movie_id)
+    if not movie:
+        raise HTTPException(status_code=404, detail=f'Movie with ID {movie_id} not found')
+
+    sync_embeddings()
+    neighbours = embedding_index.similar(movie_id, k)
+    if not neighbours and embedding_index.get(movie_id) is None:
+        raise HTTPException(status_code=404, detail=f'Movie {movie_id} has no analyzed review yet')
+
+    movies = {m.id: m for m in select_movies_by_ids(session, [neighbour_id for neighbour_id, _ in neighbours])}
+    return [
+        SimilarMovieResponse(**reshaping_movie(movies[neighbour_id]).model_dump(), similarity=similarity)
+        for neighbour_id, similarity in neighbours if neighbour_id in movies
+    ]
+
+@app.get('/images/{movie_id}', response_class=Response, tags=["Images"])
+def get_poster(session: SessionDep,
+               movie_id: Annotated[int, Path(description='ID of the movie')],
+               w: Annotated[int, Query(ge=16, le=1024, description='Thumbnail width, rounded up to a supported size')] = 200,
+               v: Annotated[Optional[str], Query(description='Version of the poster url, makes the response cacheable forever')] = None,
+               accept: Annotated[Optional[str], Header()] = None,
+               if_none_match: Annotated[Optional[str], Header()] = None
+               ):
+    '''
+    Poster thumbnail of a movie, proxied from its `image_url`.
+    The original is downloaded once, thumbnails are cached on disk per (url, width, format):
+    WebP when the client accepts it, JPEG otherwise.
+    Returns:
+        Response: image bytes with cache headers (`immutable` when `v` matches the current poster url).
+    '''
+    movie = session.get(MoviesTable, movie_id)
+    if not movie or not movie.image_url:
+        raise HTTPException(status_code=404, detail=f'Poster of movie {movie_id} not found')
+
+    fmt = 'webp' if accept and 'image/webp' in accept else 'jpeg'
+    try:
+        data, media_type, key = image_cache.thumbnail(movie.image_url, w, fmt)
+    except Exception as e:
+        logging.warning(f"Poster proxy failed for movie {movie_id} ({movie.image_url}): {e}")
+        raise HTTPException(status_code=502, detail='Could not fetch the poster image')
+
+    # a stale `v` (poster url changed since) must not be cached forever
+    if v is not None and v == url_version(movie.image_url):
+        cache_control = 'public, max-age=31536000, immutable'
+    else:
+        cache_control = 'public, max-age=3600'
+    headers = {'Cache-Control': cache_control, 'ETag': f'"{key}"', 'Vary': 'Accept'}
+    if if_none_match == headers['ETag']:
+        return Response(status_code=304, headers=headers)
+    return Response(content=data, media_type=media_type, headers=headers)
 
 @app.post('/movies/review_analyze', response_model=List[MovieResponse])
-async def analyze_review(session: SessionDep):
+def analyze_review(session: SessionDep):
     '''
     Analyze the sentiment of all movies with reviews.
 
     This endpoint uses KoBERT to compute sentiment scores and updates
-    the sentiment field in the database.
+    the sentiment field in the database. Reviews of the `reviews` table
+    that have not been scored yet are analyzed in the same pass and
+    folded into the per-movie aggregates.
 
     Returns:
         List[MovieResponse]: List of analyzed movies with predicted sentiment.
     '''
-    movies = session.exec(select(MoviesTable).where(MoviesTable.review != None)).all()
-    if not movies:
-        raise HTTPException(status_code=404, detail='No reviews found for analysis')
+    require_reviews(session)
 
-    analyzed_movies = []
-    for movie in movies:
-        inputs = tokenizer(movie.review, return_tensors='pt', truncation=True, padding=True, max_length=512).to(device)
-        outputs = model(**inputs)
-        probs = outputs.logits.softmax(dim=1).detach().cpu().numpy()[0]
+    # plain `def`: this drain blocks (model forward passes), so it runs in the threadpool, not on the event loop.
+    # pending movies are leased chunk by chunk, so concurrent calls and workers split the work
+    while process_analysis_chunk(session) is not None:
+        pass
+    sync_catalog()
 
-        sentiment_dict = {'positive': float(probs[1]), 'negative': float(probs[0])}
-        movie.sentiment = json.dumps(sentiment_dict)
-        session.add(movie)
-        analyzed_movies.append(
-            MovieResponse(
-                id=movie.id,
-                title=movie.title,
-                director=movie.director,
-                category=movie.category,
-                rating=movie.rating,
-                image_url=movie.image_url,
-                review=movie.review,
-                predicted_sentiment=sentiment_dict
-            )
-        )
+    movies = session.exec(select(MoviesTable).where(HAS_REVIEWS)).all()
+    return reshaping_movies(movies)
 
-    session.commit()
-    return analyzed_movies
\ No newline at end of file
+@app.post('/movies/review_analyze/stream', response_class=StreamingResponse)
+async def analyze_review_stream(session: SessionDep):
+    '''
+    Same analysis as `/movies/review_analyze`, streamed as NDJSON (one JSON object per line).
+
+    Pending movies are leased, analyzed and committed in chunks of `ANALYZE_CHUNK_SIZE`,
+    and every chunk is sent as soon as it is committed:
+        {"event": "start", "total": N}
+        {"event": "batch", "done": k, "total": N, "movies": [MovieResponse, ...]}
+        {"event": "done", "done": N, "total": N}
+    An {"event": "error", "detail": ...} line ends the stream if a chunk fails (earlier chunks stay committed).
+    Movies leased by other replicas / workers are not waited for.
+    '''
+    require_reviews(session)
+    pending = count_pending_analysis(session)
+
+    def event_stream():
+        # the request session is closed once the response starts, so the stream owns its session
+        total = pending
+        done = 0
+        yield json.dumps({'event': 'start', 'total': total}) + '\n'
+        with Session(engine) as stream_session:
+            while True:
+                try:
+                    analyzed = process_analysis_chunk(stream_session)
+                except Exception as e:
+                    logging.error(f"Streaming analysis failed: {e}")
+                    yield json.dumps({'event': 'error', 'done': done, 'total': total, 'detail': str(e)}) + '\n'
+                    return
+                if analyzed is None:
+                    break
+                sync_catalog()
+                done += len(analyzed)
+                # reviews written during the stream add work
+                total = max(total, done)
+                movies = [reshaping_movie(movie).model_dump(mode='json') for movie in analyzed]
+                yield json.dumps({'event': 'batch', 'done': done, 'total': total, 'movies': movies}, ensure_ascii=False) + '\n'
+        yield json.dumps({'event': 'done', 'done': done, 'total': total}) + '\n'
+
+    return StreamingResponse(event_stream(), media_type='application/x-ndjson')
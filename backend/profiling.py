@@ -0,0 +1,224 @@
+import os
+import sys
+import time
+import threading
+import contextvars
+from collections import Counter, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qsl
+
+# spans kept per trace (a big analysis can run thousands of statements)
+MAX_SPANS = 1000
+# innermost frames of a thread that is only waiting: not sampled
+IDLE_FRAMES = {('threading.py', 'wait'), ('selectors.py', 'select'), ('queue.py', 'get'), ('socket.py', 'accept'),
+               ('thread.py', '_worker')}
+
+_current_trace: contextvars.ContextVar[Optional['Trace']] = contextvars.ContextVar('current_trace', default=None)
+# thread ident -> trace of the request that thread last ran code for (seen by `span` / `record_span`)
+_thread_traces: Dict[int, 'Trace'] = {}
+
+
+def _mark_thread(trace: 'Trace'):
+    _thread_traces[threading.get_ident()] = trace
+
+
+@dataclass
+class Span:
+    name: str
+    start_ms: float
+    duration_ms: float
+    detail: Optional[str] = None
+
+
+@dataclass
+class Trace:
+    '''Timing of one request: spans are relative to the start of the request.'''
+    method: str
+    path: str
+    query: str
+    started_at: str = field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    status: Optional[int] = None
+    duration_ms: float = 0.0
+    spans: List[Span] = field(default_factory=list)
+    dropped_spans: int = 0
+    start: float = field(default_factory=time.perf_counter, repr=False)
+
+    def add(self, name: str, start: float, end: float, detail: Optional[str] = None):
+        # list.append is atomic: spans may come from threadpool threads of the same request
+        if len(self.spans) >= MAX_SPANS:
+            self.dropped_spans += 1
+            return
+        self.spans.append(Span(name, round((start - self.start) * 1000, 3), round((end - start) * 1000, 3), detail))
+
+    def as_dict(self) -> Dict[str, Any]:
+        trace = asdict(self)
+        trace.pop('start')
+        return trace
+
+
+@contextmanager
+def span(name: str, detail: Optional[str] = None):
+    '''Time a block as a span of the current request (no-op outside a traced request).'''
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    _mark_thread(trace)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, start, time.perf_counter(), detail)
+
+
+def record_span(name: str, start: float, end: float, detail: Optional[str] = None):
+    '''Same as `span` for timings taken elsewhere (ex. SQLAlchemy cursor events).'''
+    trace = _current_trace.get()
+    if trace is not None:
+        _mark_thread(trace)
+        trace.add(name, start, end, detail)
+
+
+class SlowTraceBuffer:
+    '''Ring buffer of the most recent slow requests, served by `/debug/slow`.'''
+
+    def __init__(self, size: int):
+        self._traces: deque = deque(maxlen=size)
+
+    def add(self, trace: Trace):
+        self._traces.append(trace)
+
+    def recent(self) -> List[Dict[str, Any]]:
+        return [trace.as_dict() for trace in reversed(list(self._traces))]
+
+
+class SamplingProfiler:
+    '''
+    Samples the Python stacks of the threads running `trace`'s request every `interval` seconds while running.
+    Async code runs on the event loop thread and `def` endpoints / dependencies in threadpool threads: a thread
+    belongs to the request from its first span or SQL statement (`record_span`) for it until it runs one for
+    another request. Threads that are only waiting are left out.
+    '''
+
+    def __init__(self, trace: Trace, interval: float = 0.005):
+        self.trace = trace
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or _thread_traces.get(thread_id) is not self.trace:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                    frame = frame.f_back
+                if thread_id not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        '''Folded stacks ("root;...;leaf count" per line), the input of flamegraph.pl / speedscope.'''
+        return ''.join(f'{stack} {count}\n' for stack, count in self.samples.most_common())
+
+
+def profile_requested(scope) -> bool:
+    headers = dict(scope.get('headers', []))
+    if headers.get(b'x-profile', b'').lower() in (b'1', b'true'):
+        return True
+    query = dict(parse_qsl(scope.get('query_string', b'').decode('latin-1')))
+    return query.get('profile', '').lower() in ('1', 'true')
+
+
+class ProfilingMiddleware:
+    '''
+    ASGI middleware tracing every request (spans recorded by `span` / `record_span`).
+
+    Requests slower than `slow_ms` are kept in `buffer`. A request with `X-Profile: 1`
+    (or `?profile=1`) and a valid `X-Admin-Token` runs under the sampling profiler and its
+    response is replaced by the folded stacks (original status in `x-profile-status`).
+    Profiled requests are flagged in the scope (`scope['profile']`) so they are never coalesced.
+    Without `admin_token` requests are passed through untraced.
+    '''
+
+    def __init__(self, app, admin_token: Optional[str], slow_ms: float, buffer: SlowTraceBuffer, interval: float = 0.005):
+        self.app = app
+        self.admin_token = admin_token
+        self.slow_ms = slow_ms
+        self.buffer = buffer
+        self.interval = interval
+
+    def is_admin(self, scope) -> bool:
+        token = dict(scope.get('headers', [])).get(b'x-admin-token')
+        return bool(self.admin_token) and token is not None and token.decode('latin-1') == self.admin_token
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not self.admin_token:
+            await self.app(scope, receive, send)
+            return
+
+        if profile_requested(scope):
+            if not self.is_admin(scope):
+                await self._send_text(send, 403, b'Profiling requires a valid X-Admin-Token\n')
+                return
+            scope['profile'] = True
+
+        trace = Trace(scope['method'], scope['path'], scope.get('query_string', b'').decode('latin-1'))
+        token = _current_trace.set(trace)
+        _mark_thread(trace)
+
+        async def traced_send(message):
+            if message['type'] == 'http.response.start':
+                trace.status = message['status']
+            # a profiled request answers with its profile instead of its own response
+            if not scope.get('profile'):
+                await send(message)
+
+        try:
+            if scope.get('profile'):
+                with SamplingProfiler(trace, self.interval) as profiler:
+                    await self.app(scope, receive, traced_send)
+            else:
+                await self.app(scope, receive, traced_send)
+        finally:
+            _current_trace.reset(token)
+            trace.duration_ms = round((time.perf_counter() - trace.start) * 1000, 3)
+            if trace.duration_ms >= self.slow_ms:
+                self.buffer.add(trace)
+
+        if scope.get('profile'):
+            await self._send_text(send, 200, profiler.collapsed().encode('utf-8'), [
+                (b'x-profile-status', str(trace.status).encode()),
+                (b'x-profile-samples', str(sum(profiler.samples.values())).encode()),
+                (b'x-profile-duration-ms', str(trace.duration_ms).encode()),
+            ])
+
+    @staticmethod
+    async def _send_text(send, status: int, body: bytes, headers: Optional[List] = None):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'text/plain; charset=utf-8'), (b'content-length', str(len(body)).encode())] + (headers or []),
+        })
+        await send({'type': 'http.response.body', 'body': body})
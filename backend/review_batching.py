@@ -0,0 +1,84 @@
+from dataclasses import dataclass
+from typing import Dict, Hashable, Iterable, List, Sequence
+
+
+@dataclass
+class ReviewWindow:
+    '''One model input: a (part of a) review with special tokens already attached.'''
+    key: Hashable
+    input_ids: List[int]
+
+    @property
+    def length(self) -> int:
+        return len(self.input_ids)
+
+
+def split_windows(key: Hashable, token_ids: Sequence[int], cls_id: int, sep_id: int,
+                  max_length: int = 512, stride: int = 128) -> List[ReviewWindow]:
+    '''
+    Split the token ids of one review into windows of at most `max_length` tokens.
+    Reviews longer than the model limit are covered by overlapping windows
+    (`stride` tokens shared by neighbours) instead of being truncated.
+    Args:
+        key: identifier of the review, used later to aggregate the window scores.
+        token_ids: token ids of the review without special tokens.
+        cls_id, sep_id: special token ids wrapped around every window.
+    '''
+    body = max_length - 2
+    if body <= 0:
+        raise ValueError('max_length must leave room for [CLS] and [SEP]')
+    if not 0 <= stride < body:
+        raise ValueError('stride must be smaller than the window body')
+
+    token_ids = list(token_ids)
+    if len(token_ids) <= body:
+        return [ReviewWindow(key, [cls_id] + token_ids + [sep_id])]
+
+    windows = []
+    step = body - stride
+    start = 0
+    while True:
+        chunk = token_ids[start:start + body]
+        windows.append(ReviewWindow(key, [cls_id] + chunk + [sep_id]))
+        if start + body >= len(token_ids):
+            break
+        start += step
+    return windows
+
+
+def build_batches(windows: Iterable[ReviewWindow], token_budget: int) -> List[List[ReviewWindow]]:
+    '''
+    Bucket windows by length and fill every batch up to `token_budget` padded tokens.
+    Windows are sorted by length, so each batch pads to a length close to its members,
+    and `batch_size * longest_window` never exceeds the budget (a single window always fits).
+    '''
+    batches = []
+    current: List[ReviewWindow] = []
+    for window in sorted(windows, key=lambda w: w.length):
+        # sorted ascending: the new window is the longest one of the batch
+        if current and (len(current) + 1) * window.length > token_budget:
+            batches.append(current)
+            current = []
+        current.append(window)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def aggregate_scores(windows: Sequence[ReviewWindow], scores: Sequence[Sequence[float]]) -> Dict[Hashable, List[float]]:
+    '''
+    Combine window scores back into one score vector per review key,
+    weighted by the number of tokens each window covers.
+    '''
+    sums: Dict[Hashable, List[float]] = {}
+    weights: Dict[Hashable, int] = {}
+    for window, score in zip(windows, scores):
+        weight = window.length
+        if window.key not in sums:
+            sums[window.key] = [0.0] * len(score)
+            weights[window.key] = 0
+        acc = sums[window.key]
+        for idx, value in enumerate(score):
+            acc[idx] += float(value) * weight
+        weights[window.key] += weight
+    return {key: [value / weights[key] for value in acc] for key, acc in sums.items()}
@@ -0,0 +1,193 @@
+import unicodedata
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Hangul syllable block and initial consonant (choseong), vowel (jungseong) and final consonant (jongseong) tables
+HANGUL_BASE = 0xAC00
+HANGUL_LAST = 0xD7A3
+SYLLABLES_PER_CHOSEONG = 21 * 28
+CHOSEONG = 'ㄱㄲㄴㄷㄸㄹㅁㅂㅃㅅㅆㅇㅈㅉㅊㅋㅌㅍㅎ'
+JUNGSEONG = 'ㅏㅐㅑㅒㅓㅔㅕㅖㅗㅘㅙㅚㅛㅜㅝㅞㅟㅠㅡㅢㅣ'
+JONGSEONG = ('',) + tuple('ㄱㄲㄳㄴㄵㄶㄷㄹㄺㄻㄼㄽㄾㄿㅀㅁㅂㅄㅅㅆㅇㅈㅊㅋㅌㅍㅎ')
+# compound vowels / final consonants are typed as two keys (ㅚ = ㅗ + ㅣ, ㄺ = ㄹ + ㄱ)
+KEYSTROKES = {
+    'ㅘ': 'ㅗㅏ', 'ㅙ': 'ㅗㅐ', 'ㅚ': 'ㅗㅣ', 'ㅝ': 'ㅜㅓ', 'ㅞ': 'ㅜㅔ', 'ㅟ': 'ㅜㅣ', 'ㅢ': 'ㅡㅣ',
+    'ㄳ': 'ㄱㅅ', 'ㄵ': 'ㄴㅈ', 'ㄶ': 'ㄴㅎ', 'ㄺ': 'ㄹㄱ', 'ㄻ': 'ㄹㅁ', 'ㄼ': 'ㄹㅂ', 'ㄽ': 'ㄹㅅ',
+    'ㄾ': 'ㄹㅌ', 'ㄿ': 'ㄹㅍ', 'ㅀ': 'ㄹㅎ', 'ㅄ': 'ㅂㅅ',
+}
+# Leading conjoining jamo (U+1100 ~ U+1112) in the same order as CHOSEONG
+LEADING_JAMO_BASE = 0x1100
+
+# (key, field, text, movie_id)
+Entry = Tuple[str, str, str, int]
+
+
+def normalize(text: str) -> str:
+    '''
+    Normalize text for prefix matching.
+    NFC keeps compatibility jamo (ㄱ, ㄴ ...) as they are, NFKC would turn them into conjoining jamo.
+    '''
+    text = unicodedata.normalize('NFC', text or '')
+    chars = []
+    for ch in text.casefold():
+        code = ord(ch)
+        if LEADING_JAMO_BASE <= code < LEADING_JAMO_BASE + len(CHOSEONG):
+            ch = CHOSEONG[code - LEADING_JAMO_BASE]
+        chars.append(ch)
+    return ' '.join(''.join(chars).split())
+
+
+def to_choseong(text: str) -> str:
+    '''
+    Replace every Hangul syllable with its initial consonant. ex) 범죄도시 -> ㅂㅈㄷㅅ
+    '''
+    chars = []
+    for ch in text:
+        code = ord(ch)
+        if HANGUL_BASE <= code <= HANGUL_LAST:
+            ch = CHOSEONG[(code - HANGUL_BASE) // SYLLABLES_PER_CHOSEONG]
+        chars.append(ch)
+    return ''.join(chars)
+
+
+def to_jamo(text: str) -> str:
+    '''
+    Spell every Hangul syllable as the keys typed for it. ex) 범죄도시 -> ㅂㅓㅁㅈㅗㅣㄷㅗㅅㅣ
+    The keystroke order does not depend on where the IME draws syllable boundaries,
+    so input still being composed (버, 범ㅈ, 벚 for 버지...) is a prefix of what it will become.
+    '''
+    chars = []
+    for ch in text:
+        code = ord(ch)
+        if HANGUL_BASE <= code <= HANGUL_LAST:
+            code -= HANGUL_BASE
+            ch = (CHOSEONG[code // SYLLABLES_PER_CHOSEONG] + JUNGSEONG[code % SYLLABLES_PER_CHOSEONG // 28]
+                  + JONGSEONG[code % 28])
+            chars.extend(KEYSTROKES.get(jamo, jamo) for jamo in ch)
+        else:
+            chars.append(KEYSTROKES.get(ch, ch))
+    return ''.join(chars)
+
+
+def has_hangul(text: str) -> bool:
+    return any(HANGUL_BASE <= ord(ch) <= HANGUL_LAST for ch in text)
+
+
+def index_keys(value: str) -> List[str]:
+    '''
+    Keys for one field value: the jamo spelling of the whole normalized string and of every word-start suffix,
+    plus the choseong form of those when the value contains Hangul.
+    Choseong keys only hold consonants, so only queries without any vowel (ㅂㅈㄷㅅ) reach them.
+    '''
+    norm = normalize(value)
+    if not norm:
+        return []
+    words = [norm]
+    for pos, ch in enumerate(norm):
+        if ch == ' ' and pos + 1 < len(norm):
+            words.append(norm[pos + 1:])
+    keys = [to_jamo(word) for word in words]
+    if has_hangul(norm):
+        keys.extend([to_jamo(to_choseong(word)) for word in words])
+    return list(dict.fromkeys(keys))
+
+
+class SuggestIndex:
+    '''
+    In-memory prefix index of movie titles and director names.
+
+    Entries live in one sorted list, so a lookup is a single bisect followed by
+    a short forward scan. Insert/remove keep the list sorted, so the index is
+    maintained incrementally instead of being rebuilt on every write.
+    `seq` is the change log position the index reflects.
+    '''
+    FIELDS = ('title', 'director')
+
+    def __init__(self):
+        self._entries: List[Entry] = []
+        self._by_movie: Dict[int, List[Entry]] = {}
+        self._lock = threading.Lock()
+        self.seq = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _make_entries(self, movie_id: int, title: str, director: str) -> List[Entry]:
+        entries = []
+        for field, value in zip(self.FIELDS, (title, director)):
+            for key in index_keys(value):
+                entries.append((key, field, value, movie_id))
+        return entries
+
+    def build(self, rows: Iterable[Tuple[int, str, str]], seq: int = 0):
+        '''
+        Rebuild the whole index from (movie_id, title, director) rows, read at change log position `seq`.
+        '''
+        by_movie = {}
+        entries = []
+        for movie_id, title, director in rows:
+            movie_entries = self._make_entries(movie_id, title, director)
+            by_movie[movie_id] = movie_entries
+            entries.extend(movie_entries)
+        entries.sort()
+        with self._lock:
+            self._entries = entries
+            self._by_movie = by_movie
+            self.seq = seq
+
+    def _remove_locked(self, movie_id: int):
+        for entry in self._by_movie.pop(movie_id, []):
+            pos = bisect_left(self._entries, entry)
+            if pos < len(self._entries) and self._entries[pos] == entry:
+                del self._entries[pos]
+
+    def add(self, movie_id: int, title: str, director: str):
+        entries = self._make_entries(movie_id, title, director)
+        with self._lock:
+            # most changes (reviews, ratings ...) leave the title and director as they are
+            if self._by_movie.get(movie_id) == entries:
+                return
+            self._remove_locked(movie_id)
+            for entry in entries:
+                pos = bisect_left(self._entries, entry)
+                self._entries.insert(pos, entry)
+            self._by_movie[movie_id] = entries
+
+    # add() already drops the previous entries of the movie
+    update = add
+
+    def remove(self, movie_id: int):
+        with self._lock:
+            self._remove_locked(movie_id)
+
+    def suggest(self, prefix: str, limit: int = 10, field: Optional[str] = None) -> List[Dict]:
+        '''
+        Return up to `limit` distinct suggestions whose key starts with `prefix`, compared jamo by jamo:
+        complete syllables match exactly and a trailing syllable still being typed ("버", "범ㅈ") matches
+        the syllables it can become. A prefix of consonants only ("ㅂㅈ") matches initial consonants (choseong).
+        '''
+        query = to_jamo(normalize(prefix))
+        if not query:
+            return []
+
+        results = []
+        seen = set()
+        # duplicated keys (suffixes, same title in several movies) are skipped, but never scan forever
+        max_scan = max(limit, 1) * 50
+        with self._lock:
+            entries = self._entries
+            pos = bisect_left(entries, (query,))
+            end = min(len(entries), pos + max_scan)
+            while pos < end and len(results) < limit:
+                key, entry_field, text, movie_id = entries[pos]
+                if not key.startswith(query):
+                    break
+                pos += 1
+                if field and entry_field != field:
+                    continue
+                if (entry_field, text) in seen:
+                    continue
+                seen.add((entry_field, text))
+                results.append({'text': text, 'field': entry_field, 'movie_id': movie_id})
+        return results
@@ -0,0 +1,63 @@
+import os
+import tempfile
+
+import pytest
+
+# main opens its database, poster cache and embedding matrix at import: keep them in a scratch directory
+_data_dir = tempfile.mkdtemp()
+os.environ['SQLITE_DB_PATH'] = os.path.join(_data_dir, 'movies.db')
+os.environ['IMAGE_CACHE_DIR'] = os.path.join(_data_dir, 'image_cache')
+os.environ['EMBEDDING_CACHE_DIR'] = os.path.join(_data_dir, 'embedding_cache')
+# the sentiment model is never downloaded: tests needing one use `stub_model`
+os.environ.setdefault('HF_HUB_OFFLINE', '1')
+
+
+@pytest.fixture
+def db():
+    '''The `main` module, with every table of its scratch database emptied.'''
+    import main
+    from sqlmodel import Session, delete
+
+    main.create_db_and_tables()
+    with Session(main.engine) as session:
+        for table in (main.ReviewsTable, main.ReviewTokensTable, main.MovieEmbeddingsTable, main.ChangesTable,
+                      main.ChangeLogStateTable, main.MoviesTable):
+            session.execute(delete(table))
+        session.commit()
+    main.build_suggest_index()
+    return main
+
+
+@pytest.fixture
+def client(db):
+    from fastapi.testclient import TestClient
+
+    # no lifespan: no background tasks, group-committed writes are committed one by one
+    return TestClient(db.app)
+
+
+class StubTokenizer:
+    '''One token per character, inside the vocabulary of the stub model.'''
+    pad_token_id = 0
+    cls_token_id = 2
+    sep_token_id = 3
+
+    def __call__(self, texts, add_special_tokens=False):
+        return {'input_ids': [[5 + ord(ch) % 90 for ch in text] for text in texts]}
+
+
+@pytest.fixture
+def stub_model(db, monkeypatch):
+    '''A small random BERT classifier in place of KoBERT (same 5 classes); `main` has none when loading failed.'''
+    import torch
+    from transformers import BertConfig, BertForSequenceClassification
+
+    torch.manual_seed(0)
+    model = BertForSequenceClassification(BertConfig(
+        vocab_size=100, hidden_size=16, num_hidden_layers=1, num_attention_heads=2,
+        intermediate_size=32, num_labels=5)).eval()
+    monkeypatch.setattr(db, 'tokenizer', StubTokenizer(), raising=False)
+    monkeypatch.setattr(db, 'model', model, raising=False)
+    monkeypatch.setattr(db, 'device', torch.device('cpu'))
+    monkeypatch.setattr(db, 'model_is_ready', True)
+    return model
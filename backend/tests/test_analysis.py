@@ -0,0 +1,258 @@
+import functools
+import json
+import sqlite3
+import threading
+from contextlib import closing
+
+import pytest
+import torch
+from sqlmodel import Session, select
+
+
+def create_movie(client, title, review=None):
+    response = client.post('/movies', json={'title': title, 'director': '감독', 'category': '드라마'})
+    assert response.status_code == 201
+    movie_id = response.json()['id']
+    if review is not None:
+        assert client.post(f'/movies/{movie_id}/reviews', json=review).status_code == 201
+    return movie_id
+
+
+def add_movies(db, count, reviews=1):
+    with Session(db.engine) as session:
+        movie_ids = []
+        for number in range(count):
+            movie = db.MoviesTable(title=f'영화 {number}', director='감독', category='드라마')
+            session.add(movie)
+            session.flush()
+            for review in range(reviews):
+                db.insert_review(session, movie.id, f'{number}번 영화 리뷰 {review}')
+            movie_ids.append(movie.id)
+        session.commit()
+    return movie_ids
+
+
+def get_movie(db, movie_id):
+    with Session(db.engine) as session:
+        return session.get(db.MoviesTable, movie_id)
+
+
+def test_scoring_does_not_hold_the_write_lock(client, db, stub_model, monkeypatch):
+    create_movie(client, '기생충', review='처음 보는 리뷰라 토큰 캐시에 없다')
+    other_id = create_movie(client, '괴물')
+    build_batches = db.build_batches
+    written = []
+
+    def batches_with_concurrent_write(*args, **kwargs):
+        for batch in build_batches(*args, **kwargs):
+            # another replica / worker writes while this chunk runs through the model: no busy wait allowed
+            with closing(sqlite3.connect(db.sqlite_file_name, timeout=0)) as connection:
+                connection.execute('UPDATE movie_info SET rating = 9.5 WHERE id = ?', (other_id,))
+                connection.commit()
+            written.append(len(batch))
+            yield batch
+
+    monkeypatch.setattr(db, 'build_batches', batches_with_concurrent_write)
+    assert client.post('/movies/review_analyze').status_code == 200
+    assert written
+    assert client.get('/movies/filter', params={'title': '괴물'}).json()[0]['rating'] == 9.5
+
+
+def test_scores_and_embeddings_of_one_encoder_pass(db, stub_model):
+    texts = {'short': '좋다', 'long': '배우들 연기가 정말 좋았다 ' * 10}
+    with Session(db.engine) as session:
+        scores, embeddings = db.score_reviews(session, texts)
+
+    for key, text in texts.items():
+        ids = [db.tokenizer.cls_token_id] + db.tokenizer([text])['input_ids'][0] + [db.tokenizer.sep_token_id]
+        with torch.inference_mode():
+            reference = stub_model(input_ids=torch.tensor([ids]), output_hidden_states=True)
+        assert scores[key] == pytest.approx(reference.logits.softmax(dim=1)[0].tolist(), abs=1e-5)
+        assert embeddings[key] == pytest.approx(reference.hidden_states[-1][0].mean(dim=0).tolist(), abs=1e-5)
+
+
+def test_concurrent_claims_are_disjoint(db):
+    movie_ids = add_movies(db, 20)
+    claims = []
+
+    def claimer():
+        with Session(db.engine) as session:
+            # bounded: a claim that hands out leased movies again would never run dry
+            for _ in range(len(movie_ids)):
+                _, claimed = db.claim_analysis_chunk(session, 3)
+                if not claimed:
+                    return
+                claims.append(claimed)
+
+    threads = [threading.Thread(target=claimer) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    claimed = [movie_id for chunk in claims for movie_id in chunk]
+    assert sorted(claimed) == movie_ids
+    assert all(len(chunk) <= 3 for chunk in claims)
+
+
+def test_expired_lease_is_reclaimed_and_the_stale_owner_writes_nothing(db, stub_model, monkeypatch):
+    [movie_id] = add_movies(db, 1)
+    with Session(db.engine) as session:
+        session.get(db.MoviesTable, movie_id).review = '예전 방식의 리뷰'
+        session.commit()
+
+    with Session(db.engine) as stale, Session(db.engine) as fresh:
+        # the first worker stalls past its lease
+        monkeypatch.setattr(db, 'ANALYZE_LEASE_SECONDS', -1)
+        stale_owner, claimed = db.claim_analysis_chunk(stale, 10)
+        assert claimed == [movie_id]
+        monkeypatch.setattr(db, 'ANALYZE_LEASE_SECONDS', 300)
+        fresh_owner, reclaimed = db.claim_analysis_chunk(fresh, 10)
+        assert reclaimed == [movie_id] and fresh_owner != stale_owner
+
+        db.analyze_movies(stale, claimed, stale_owner)
+        movie = get_movie(db, movie_id)
+        assert movie.lease_owner == fresh_owner and movie.analysis_pending
+        assert movie.sentiment_raw is None
+
+        db.analyze_movies(fresh, reclaimed, fresh_owner)
+    movie = get_movie(db, movie_id)
+    assert not movie.analysis_pending and movie.lease_owner is None
+    assert movie.sentiment_raw is not None
+    # both workers scored the reviews row: counted once
+    assert movie.sentiment_count == 1
+
+
+def test_failed_chunk_releases_its_leases(db, monkeypatch):
+    movie_ids = add_movies(db, 3)
+
+    def fail(session, reviews):
+        raise RuntimeError('model crashed')
+
+    monkeypatch.setattr(db, 'score_reviews', fail)
+    with Session(db.engine) as session:
+        with pytest.raises(RuntimeError):
+            db.process_analysis_chunk(session, limit=10)
+        # claimable again right away, not after the lease expired
+        _, claimed = db.claim_analysis_chunk(session, 10)
+    assert claimed == movie_ids
+
+
+def test_review_written_mid_chunk_keeps_the_movie_pending(db, stub_model, monkeypatch):
+    [movie_id] = add_movies(db, 1)
+    score_reviews = db.score_reviews
+
+    def score_while_a_review_arrives(session, reviews):
+        result = score_reviews(session, reviews)
+        with Session(db.engine) as writer:
+            db.insert_review(writer, movie_id, '채점 중에 도착한 리뷰')
+            writer.commit()
+        return result
+
+    monkeypatch.setattr(db, 'score_reviews', score_while_a_review_arrives)
+    with Session(db.engine) as session:
+        db.process_analysis_chunk(session)
+    movie = get_movie(db, movie_id)
+    assert movie.analysis_pending and movie.lease_owner is None
+    assert (movie.review_count, movie.sentiment_count) == (2, 1)
+
+    monkeypatch.setattr(db, 'score_reviews', score_reviews)
+    with Session(db.engine) as session:
+        db.process_analysis_chunk(session)
+        assert db.process_analysis_chunk(session) is None
+    movie = get_movie(db, movie_id)
+    assert not movie.analysis_pending
+    assert (movie.review_count, movie.sentiment_count) == (2, 2)
+
+
+def test_review_scored_twice_is_counted_once(db):
+    [movie_id] = add_movies(db, 1)
+    with Session(db.engine) as first, Session(db.engine) as second:
+        # two workers read the review before either scored it
+        review = first.exec(select(db.ReviewsTable).where(db.ReviewsTable.movie_id == movie_id)).one()
+        same_review = second.get(db.ReviewsTable, review.id)
+        assert db.apply_review_sentiment(first, review, {'positive': 0.8, 'negative': 0.2})
+        first.commit()
+        assert not db.apply_review_sentiment(second, same_review, {'positive': 0.6, 'negative': 0.4})
+        second.commit()
+
+        # a rescore from the current value only moves the sum by the difference
+        first.refresh(review)
+        assert db.apply_review_sentiment(first, review, {'positive': 0.5, 'negative': 0.5})
+        first.commit()
+    movie = get_movie(db, movie_id)
+    assert movie.sentiment_count == 1
+    assert movie.positive_sum == pytest.approx(0.5)
+
+
+def stream_events(client):
+    with client.stream('POST', '/movies/review_analyze/stream') as response:
+        assert response.status_code == 200
+        assert response.headers['content-type'].startswith('application/x-ndjson')
+        return [json.loads(line) for line in response.iter_lines() if line]
+
+
+def test_stream_sends_start_batches_and_done(db, client, stub_model, monkeypatch):
+    movie_ids = add_movies(db, 5)
+    monkeypatch.setattr(db, 'process_analysis_chunk', functools.partial(db.process_analysis_chunk, limit=2))
+
+    events = stream_events(client)
+    assert [event['event'] for event in events] == ['start', 'batch', 'batch', 'batch', 'done']
+    assert events[0] == {'event': 'start', 'total': 5}
+    batches = events[1:-1]
+    assert [batch['done'] for batch in batches] == [2, 4, 5]
+    # the frontend draws done / total as a progress bar
+    assert all(0 < batch['done'] <= batch['total'] for batch in batches)
+    assert sorted(movie['id'] for batch in batches for movie in batch['movies']) == movie_ids
+    assert all(movie['sentiment_mean'] is not None for batch in batches for movie in batch['movies'])
+    assert events[-1] == {'event': 'done', 'done': 5, 'total': 5}
+
+
+def test_stream_ends_with_an_error_line_when_a_chunk_fails(db, client, stub_model, monkeypatch):
+    movie_ids = add_movies(db, 4)
+    monkeypatch.setattr(db, 'process_analysis_chunk', functools.partial(db.process_analysis_chunk, limit=2))
+    score_reviews = db.score_reviews
+    calls = []
+
+    def fail_on_second_chunk(session, reviews):
+        calls.append(reviews)
+        if len(calls) == 2:
+            raise RuntimeError('model crashed')
+        return score_reviews(session, reviews)
+
+    monkeypatch.setattr(db, 'score_reviews', fail_on_second_chunk)
+    events = stream_events(client)
+    assert [event['event'] for event in events] == ['start', 'batch', 'error']
+    assert events[-1] == {'event': 'error', 'done': 2, 'total': 4, 'detail': 'model crashed'}
+
+    # the first chunk stays committed, the failed one is back in the queue
+    analyzed = {movie['id'] for movie in events[1]['movies']}
+    assert [get_movie(db, movie_id).analysis_pending for movie_id in movie_ids] == \
+        [movie_id not in analyzed for movie_id in movie_ids]
+    with Session(db.engine) as session:
+        assert db.count_pending_analysis(session) == 2
+
+
+def test_stream_total_grows_with_reviews_written_meanwhile(db, client, stub_model, monkeypatch):
+    add_movies(db, 2)
+    monkeypatch.setattr(db, 'process_analysis_chunk', functools.partial(db.process_analysis_chunk, limit=1))
+    score_reviews = db.score_reviews
+    arrived = []
+
+    def score_while_a_movie_is_reviewed(session, reviews):
+        if not arrived:
+            arrived.append(create_movie(client, '분석 중에 리뷰된 영화', review='새 리뷰'))
+        return score_reviews(session, reviews)
+
+    monkeypatch.setattr(db, 'score_reviews', score_while_a_movie_is_reviewed)
+    events = stream_events(client)
+    assert events[0] == {'event': 'start', 'total': 2}
+    assert [(batch['done'], batch['total']) for batch in events[1:-1]] == [(1, 2), (2, 2), (3, 3)]
+    assert events[-1] == {'event': 'done', 'done': 3, 'total': 3}
+
+
+def test_analysis_without_reviews_is_not_found(db, client):
+    create_movie(client, '리뷰 없는 영화')
+    for path in ('/movies/review_analyze', '/movies/review_analyze/stream'):
+        response = client.post(path)
+        assert response.status_code == 404
+        assert response.json()['detail'] == 'No reviews found for analysis'
@@ -0,0 +1,98 @@
+import asyncio
+import json
+import random
+
+import pytest
+from sqlmodel import Session
+
+from catalog_snapshot import CatalogSnapshot
+
+QUERIES = [
+    {'sort_by': 'rating', 'k': 5},
+    {'sort_by': 'rating', 'k': 1},
+    {'sort_by': 'rating', 'k': 50},
+    {'sort_by': 'sentiment', 'k': 7},
+    {'sort_by': 'sentiment_mean', 'k': 4},
+    {'sort_by': 'review_count', 'k': 10},
+    {'sort_by': 'rating'},
+    {'category': '액션', 'sort_by': 'rating', 'k': 3},
+    {'director': '감독1', 'min_rating': 7.5, 'sort_by': 'review_count', 'k': 2},
+    {'min_rating': 7.0, 'max_rating': 8.0},
+    {'title': '영화 3'},
+    {'category': '없는 장르'},
+    {},
+]
+
+
+def fill_catalog(main, seed):
+    # few distinct values: lots of ties at the k-th value, and missing ones
+    rng = random.Random(seed)
+    with Session(main.engine) as session:
+        for number in range(40):
+            review_count = rng.choice([0, 1, 2, 3])
+            sentiment_count = rng.randint(0, review_count)
+            movie = main.MoviesTable(
+                title=f'영화 {number % 25}', director=f'감독{number % 4}', category=rng.choice(['액션', '드라마', '코미디']),
+                rating=rng.choice([None, 5.0, 7.5, 8.0, 9.0]), review_count=review_count,
+                sentiment_count=sentiment_count, positive_sum=float(sentiment_count) * rng.choice([0.25, 0.5]))
+            if rng.random() < 0.7:
+                # stored the way analysis does
+                movie.sentiment = json.dumps({'positive': rng.choice([0.1, 0.5, 0.9]), 'negative': 0.1})
+            session.add(movie)
+        session.commit()
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_both_engines_answer_the_same(client, db, monkeypatch, seed):
+    fill_catalog(db, seed)
+    answers = {}
+    for engine in ('sqlite', 'columnar'):
+        if engine == 'columnar':
+            monkeypatch.setattr(db, 'catalog', CatalogSnapshot())
+            db.reload_catalog()
+        answers[engine] = []
+        for params in QUERIES:
+            movies = client.get('/movies/filter', params=params).json()
+            filters = {key: value for key, value in params.items() if key not in ('sort_by', 'k')}
+            count = client.get('/movies/count', params=filters).json()['count']
+            answers[engine].append(([movie['id'] for movie in movies], count))
+    assert answers['columnar'] == answers['sqlite']
+
+
+def test_top_k_breaks_ties_by_id():
+    class Movie:
+        def __init__(self, movie_id, rating):
+            self.id, self.title, self.director, self.category = movie_id, f'영화 {movie_id}', '감독', '드라마'
+            self.rating, self.predicted_sentiment, self.sentiment_mean, self.review_count = rating, None, None, 0
+
+    rng = random.Random(0)
+    for _ in range(50):
+        movies = [Movie(movie_id, rng.choice([None, 1.0, 2.0, 3.0])) for movie_id in rng.sample(range(1, 500), 60)]
+        snapshot = CatalogSnapshot()
+        snapshot.load(movies, seq=0)
+        k = rng.randint(1, 60)
+        expected = sorted(movies, key=lambda movie: (-(movie.rating if movie.rating is not None else float('-inf')), movie.id))[:k]
+        assert [movie.id for movie in snapshot.query(sort_by='rating', k=k)] == [movie.id for movie in expected]
+
+
+def test_write_endpoints_sync_off_the_event_loop(client, db, monkeypatch):
+    calls = []
+
+    def recorder(name):
+        def sync():
+            try:
+                asyncio.get_running_loop()
+                calls.append((name, 'event loop'))
+            except RuntimeError:
+                calls.append((name, 'thread'))
+        return sync
+
+    monkeypatch.setattr(db, 'sync_catalog', recorder('catalog'))
+    monkeypatch.setattr(db, 'sync_suggest_index', recorder('suggest'))
+    movie = client.post('/movies', json={'title': '기생충', 'director': '봉준호', 'category': '드라마'}).json()
+    assert client.put(f"/movies/{movie['id']}", json={**movie, 'rating': 8.5}).status_code == 200
+    assert client.post(f"/movies/{movie['id']}/review", json='좋다').status_code == 200
+    assert client.post(f"/movies/{movie['id']}/reviews", json='별로').status_code == 201
+    assert client.delete(f"/movies/{movie['id']}").status_code == 204
+    assert len(calls) == 8
+    assert {where for _, where in calls} == {'thread'}
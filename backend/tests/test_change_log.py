@@ -0,0 +1,89 @@
+import main
+from sqlmodel import Session
+
+
+def create(client, title):
+    response = client.post('/movies', json={'title': title, 'director': '감독', 'category': '드라마'})
+    assert response.status_code == 201
+    return response.json()['id']
+
+
+def position(client):
+    # same value as the `X-Change-Seq` header of GET /movies (which is a 404 while the catalog is empty)
+    with Session(main.engine) as session:
+        return main.latest_change_seq(session)
+
+
+def changes(client, since, limit=200):
+    response = client.get('/movies/changes', params={'since': since, 'limit': limit})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_compaction_keeps_newest_entry_per_movie(client):
+    since = position(client)
+    first = create(client, '기생충')
+    second = create(client, '괴물')
+    movie = client.get('/movies').json()[0]
+    assert client.put(f'/movies/{first}', json={**movie, 'title': '기생충 흑백판'}).status_code == 200
+
+    main.compact_change_log()
+
+    page = changes(client, since)
+    assert [(change['movie_id'], change['op']) for change in page['changes']] == [(second, 'insert'), (first, 'update')]
+    assert page['changes'][1]['movie']['title'] == '기생충 흑백판'
+    assert page['has_more'] is False
+
+
+def test_since_older_than_horizon_is_gone(client, monkeypatch):
+    monkeypatch.setattr(main, 'CHANGE_LOG_TOMBSTONES', 1)
+    since = position(client)
+    ids = [create(client, title) for title in ('올드보이', '박쥐', '마더')]
+    client.delete(f'/movies/{ids[0]}')
+    horizon = position(client)
+    client.delete(f'/movies/{ids[1]}')
+
+    main.compact_change_log()
+
+    # the oldest tombstone was dropped: a client before it cannot tell that the movie is gone
+    response = client.get('/movies/changes', params={'since': since})
+    assert response.status_code == 410
+    page = changes(client, horizon)
+    assert [(change['movie_id'], change['op'], change['movie']) for change in page['changes']] == [(ids[1], 'delete', None)]
+
+
+def test_deleted_then_reinserted_id(client):
+    create(client, '살인의 추억')
+    reused = create(client, '설국열차')
+    since = position(client)
+    client.delete(f'/movies/{reused}')
+    # SQLite hands out the id of the deleted last row again
+    assert create(client, '옥자') == reused
+
+    # every entry carries the current row, so the delete no longer removes the new movie
+    page = changes(client, since)
+    assert [change['op'] for change in page['changes']] == ['delete', 'insert']
+    assert all(change['movie']['title'] == '옥자' for change in page['changes'])
+
+    main.compact_change_log()
+    page = changes(client, since)
+    assert [(change['movie_id'], change['op'], change['movie']['title']) for change in page['changes']] == [(reused, 'insert', '옥자')]
+
+
+def test_has_more_paging(client):
+    since = position(client)
+    ids = [create(client, f'영화 {number}') for number in range(5)]
+
+    seen = []
+    pages = []
+    while True:
+        page = changes(client, since, limit=2)
+        seen.extend(change['movie_id'] for change in page['changes'])
+        pages.append(page['has_more'])
+        assert page['next_since'] > since
+        since = page['next_since']
+        if not page['has_more']:
+            break
+    assert seen == ids
+    assert pages == [True, True, False]
+    assert changes(client, since) == {'changes': [], 'next_since': since, 'has_more': False}
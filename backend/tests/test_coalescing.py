@@ -0,0 +1,143 @@
+import asyncio
+
+import pytest
+
+from coalescing import CoalescingStats, SingleFlightMiddleware, request_key
+
+
+class GatedApp:
+    '''ASGI app answering only once `release` is set; counts its executions, the first one can raise.'''
+
+    def __init__(self, fail_first: bool = False):
+        self.calls = 0
+        self.fail_first = fail_first
+        self.release = asyncio.Event()
+
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        call = self.calls
+        await self.release.wait()
+        if self.fail_first and call == 1:
+            raise RuntimeError('query failed')
+        body = f"{scope['path']}?{scope['query_string'].decode()} #{call}".encode()
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [(b'content-type', b'text/plain')]})
+        await send({'type': 'http.response.body', 'body': body})
+
+
+def http_scope(query: bytes = b'', method: str = 'GET', path: str = '/movies', **extra):
+    return {'type': 'http', 'method': method, 'path': path, 'query_string': query, 'headers': [], **extra}
+
+
+async def call(app, scope):
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    return messages
+
+
+def headers(messages):
+    return dict(messages[0]['headers'])
+
+
+async def arrive(*scopes, app):
+    '''Start the requests together and wait until every one of them is parked (leader in the app, followers on it).'''
+    tasks = [asyncio.create_task(call(app, scope)) for scope in scopes]
+    for _ in range(3):
+        await asyncio.sleep(0)
+    return tasks
+
+
+def test_identical_concurrent_gets_run_once():
+    async def scenario():
+        app = GatedApp()
+        stats = CoalescingStats()
+        middleware = SingleFlightMiddleware(app, lambda scope: True, stats)
+        tasks = await arrive(*[http_scope(b'k=5')] * 5, app=middleware)
+        app.release.set()
+        responses = await asyncio.gather(*tasks)
+        # nothing is cached once the leader is done
+        app.release.set()
+        later = await call(middleware, http_scope(b'k=5'))
+        return app, stats, responses, later
+
+    app, stats, responses, later = asyncio.run(scenario())
+    assert app.calls == 2
+    assert {response[1]['body'] for response in responses} == {b'/movies?k=5 #1'}
+    assert sorted(headers(response).get(b'x-coalesced', b'') for response in responses) == [b'', b'1', b'1', b'1', b'1']
+    assert later[1]['body'] == b'/movies?k=5 #2' and b'x-coalesced' not in headers(later)
+    assert (stats.requests, stats.executed, stats.collapsed, stats.failed, stats.inflight) == (6, 2, 4, 0, 0)
+    assert stats.as_dict()['collapse_ratio'] == pytest.approx(4 / 6)
+
+
+def test_query_parameter_order_gives_the_same_key():
+    assert request_key(http_scope(b'b=2&a=1')) == request_key(http_scope(b'a=1&b=2'))
+    assert request_key(http_scope(b'a=1&b=2')) != request_key(http_scope(b'a=1&b=3'))
+    assert request_key(http_scope(b'a=1', path='/movies/count')) != request_key(http_scope(b'a=1'))
+
+    async def scenario():
+        app = GatedApp()
+        middleware = SingleFlightMiddleware(app, lambda scope: True, CoalescingStats())
+        tasks = await arrive(http_scope(b'b=2&a=1'), http_scope(b'a=1&b=2'), http_scope(b'a=1&b=3'), app=middleware)
+        app.release.set()
+        return app, await asyncio.gather(*tasks)
+
+    app, responses = asyncio.run(scenario())
+    assert app.calls == 2
+    assert [headers(response).get(b'x-coalesced') for response in responses] == [None, b'1', None]
+
+
+def test_followers_run_on_their_own_when_the_leader_raises():
+    async def scenario():
+        app = GatedApp(fail_first=True)
+        stats = CoalescingStats()
+        middleware = SingleFlightMiddleware(app, lambda scope: True, stats)
+        tasks = await arrive(*[http_scope()] * 3, app=middleware)
+        app.release.set()
+        return app, stats, await asyncio.gather(*tasks, return_exceptions=True)
+
+    app, stats, (leader, *followers) = asyncio.run(scenario())
+    assert isinstance(leader, RuntimeError)
+    assert app.calls == 3
+    assert sorted(follower[1]['body'] for follower in followers) == [b'/movies? #2', b'/movies? #3']
+    assert all(b'x-coalesced' not in headers(follower) for follower in followers)
+    assert (stats.executed, stats.collapsed, stats.failed) == (3, 0, 1)
+
+
+def test_followers_run_on_their_own_when_the_leader_is_cancelled():
+    async def scenario():
+        app = GatedApp()
+        middleware = SingleFlightMiddleware(app, lambda scope: True, CoalescingStats())
+        leader, *followers = await arrive(*[http_scope()] * 3, app=middleware)
+        # the leader's client disconnects
+        leader.cancel()
+        await asyncio.sleep(0)
+        app.release.set()
+        return app, leader, await asyncio.gather(*followers)
+
+    app, leader, followers = asyncio.run(scenario())
+    assert leader.cancelled()
+    assert app.calls == 3
+    assert all(b'x-coalesced' not in headers(follower) for follower in followers)
+
+
+def test_writes_and_profiled_requests_bypass_it(db):
+    async def scenario(*scopes):
+        app = GatedApp()
+        stats = CoalescingStats()
+        middleware = SingleFlightMiddleware(app, db.is_coalesced_read, stats)
+        tasks = await arrive(*scopes, app=middleware)
+        app.release.set()
+        await asyncio.gather(*tasks)
+        return app.calls, stats.requests
+
+    assert asyncio.run(scenario(*[http_scope(method='POST', path='/movies/review_analyze')] * 2)) == (2, 0)
+    # the profiling middleware flags a profiled request in its scope
+    assert asyncio.run(scenario(*[http_scope(profile=True)] * 2)) == (2, 0)
+    assert asyncio.run(scenario(*[http_scope(path='/images/1')] * 2)) == (2, 0)
+    assert asyncio.run(scenario(*[http_scope(path='/movies/search')] * 2)) == (1, 2)
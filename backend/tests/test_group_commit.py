@@ -0,0 +1,123 @@
+import asyncio
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, event, insert, select
+from sqlalchemy.orm import Session
+
+from group_commit import GroupCommitter, enable_savepoints
+
+metadata = MetaData()
+items = Table('items', metadata, Column('id', Integer, primary_key=True), Column('name', String, unique=True))
+
+
+class Rejected(Exception):
+    pass
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'items.db'}", connect_args={'timeout': 30})
+    enable_savepoints(engine)
+    metadata.create_all(engine)
+    engine.commits = 0
+
+    def count_commit(conn):
+        engine.commits += 1
+    event.listen(engine, 'commit', count_commit)
+    return engine
+
+
+def names(engine):
+    with engine.connect() as conn:
+        return sorted(conn.execute(select(items.c.name)).scalars())
+
+
+def add(name, calls=None):
+    def op(session):
+        if calls is not None:
+            calls.append(name)
+        session.execute(insert(items).values(name=name))
+        return name
+    return op
+
+
+def add_then_reject(name, calls):
+    def op(session):
+        calls.append(name)
+        # written, then rejected: only this op's rows are rolled back
+        session.execute(insert(items).values(name=name))
+        raise Rejected(name)
+    return op
+
+
+def test_rejected_op_is_rolled_back_alone_without_rerun(engine):
+    committer = GroupCommitter(lambda: Session(engine))
+    calls = []
+    ops = [add('a', calls), add_then_reject('b', calls), add('c', calls), add('a', calls), add('d', calls)]
+
+    results = committer._commit(ops)
+
+    assert [ok for ok, _ in results] == [True, False, True, False, True]
+    assert isinstance(results[1][1], Rejected)
+    # duplicate 'a': the database error fails that op only
+    assert 'UNIQUE' in str(results[3][1])
+    assert names(engine) == ['a', 'c', 'd']
+    # every op ran once, in one transaction
+    assert calls == ['a', 'b', 'c', 'a', 'd']
+    assert engine.commits == 1
+
+
+def test_failed_commit_fails_every_op(engine):
+    committer = GroupCommitter(lambda: Session(engine))
+
+    def fail_commit(conn):
+        raise RuntimeError('disk full')
+    event.listen(engine, 'commit', fail_commit)
+
+    results = committer._commit([add('a'), add_then_reject('b', [])])
+    assert isinstance(results[0][1], RuntimeError) and isinstance(results[1][1], Rejected)
+    assert not results[0][0] and not results[1][0]
+    event.remove(engine, 'commit', fail_commit)
+    assert names(engine) == []
+
+
+def test_batches_are_bounded_by_max_batch(engine):
+    committer = GroupCommitter(lambda: Session(engine), max_batch=4, max_delay=0.2)
+    sizes = []
+    commit = committer._commit
+
+    def recording_commit(ops):
+        sizes.append(len(ops))
+        return commit(ops)
+    committer._commit = recording_commit
+
+    async def run():
+        committer.start()
+        results = await asyncio.gather(*[committer.submit(add(f'n{i}')) for i in range(10)],
+                                       committer.submit(add_then_reject('bad', [])), return_exceptions=True)
+        await committer.stop()
+        return results
+
+    results = asyncio.run(run())
+    assert results[:10] == [f'n{i}' for i in range(10)]
+    assert isinstance(results[10], Rejected)
+    assert sizes == [4, 4, 3]
+    assert engine.commits == 3
+    assert len(names(engine)) == 10
+
+
+def test_lone_write_waits_at_most_max_delay(engine):
+    committer = GroupCommitter(lambda: Session(engine), max_batch=64, max_delay=0.01)
+
+    async def run():
+        committer.start()
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        result = await committer.submit(add('solo'))
+        elapsed = loop.time() - start
+        await committer.stop()
+        return result, elapsed
+
+    result, elapsed = asyncio.run(run())
+    assert result == 'solo' and elapsed < 0.5
+    assert names(engine) == ['solo']
@@ -0,0 +1,94 @@
+import io
+import threading
+import http.server
+
+import pytest
+from PIL import Image
+
+import image_cache
+from image_cache import ImageCache, url_fetcher, is_public_address
+
+
+def poster_bytes(size=(600, 900), fmt='PNG') -> bytes:
+    out = io.BytesIO()
+    Image.new('RGB', size, (200, 30, 30)).save(out, fmt)
+    return out.getvalue()
+
+
+@pytest.fixture
+def stand_in_server():
+    '''Local stand-in for the poster host: serves one PNG and counts the requests.'''
+    hits = []
+    body = poster_bytes()
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_port}', hits
+    server.shutdown()
+
+
+def local_fetcher(url: str) -> bytes:
+    # tests only: the default fetcher refuses loopback hosts
+    import urllib.request
+    with urllib.request.urlopen(url, timeout=5) as response:
+        return response.read()
+
+
+def test_thumbnails_fetch_the_original_once(tmp_path, stand_in_server):
+    base_url, hits = stand_in_server
+    cache = ImageCache(str(tmp_path), 10 * 1024 * 1024, local_fetcher)
+
+    webp, media_type, _ = cache.thumbnail(f'{base_url}/poster.png', 150, 'webp')
+    jpeg, _, _ = cache.thumbnail(f'{base_url}/poster.png', 300, 'jpeg')
+    again, _, _ = cache.thumbnail(f'{base_url}/poster.png', 150, 'webp')
+
+    assert media_type == 'image/webp'
+    assert Image.open(io.BytesIO(webp)).size == (200, 300)
+    assert Image.open(io.BytesIO(jpeg)).size == (320, 480)
+    assert again == webp
+    assert hits == ['/poster.png']
+
+
+def test_cache_is_bounded(tmp_path, stand_in_server):
+    base_url, _ = stand_in_server
+    cache = ImageCache(str(tmp_path), 1, local_fetcher)
+    cache.thumbnail(f'{base_url}/poster.png', 64, 'jpeg')
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def test_default_fetcher_only_reaches_public_http_hosts(stand_in_server):
+    base_url, hits = stand_in_server
+    fetch = url_fetcher(timeout=2)
+    for url in ('file:///etc/hostname', 'ftp://example.com/poster.png'):
+        with pytest.raises(ValueError):
+            fetch(url)
+    with pytest.raises(OSError, match='non public address'):
+        fetch(f'{base_url}/poster.png')
+    assert hits == []
+
+
+@pytest.mark.parametrize('address, public', [
+    ('8.8.8.8', True), ('127.0.0.1', False), ('10.0.0.8', False), ('192.168.1.1', False),
+    ('169.254.169.254', False), ('::1', False), ('::ffff:127.0.0.1', False), ('fe80::1%eth0', False),
+])
+def test_is_public_address(address, public):
+    assert is_public_address(address) is public
+
+
+def test_decompression_bombs_are_not_cached(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_cache, 'MAX_IMAGE_PIXELS', 1000)
+    cache = ImageCache(str(tmp_path), 10 * 1024 * 1024, lambda url: poster_bytes((100, 100)))
+    with pytest.raises(ValueError, match='exceeds'):
+        cache.thumbnail('http://example.com/bomb.png', 64, 'jpeg')
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,85 @@
+import asyncio
+import contextvars
+import threading
+import time
+
+from profiling import ProfilingMiddleware, SamplingProfiler, SlowTraceBuffer, Trace, _current_trace, span
+
+
+def spin(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def unrelated_request_work(stop):
+    while not stop.is_set():
+        spin(0.001)
+
+
+def profiled_request_work():
+    with span('work'):
+        spin(0.3)
+
+
+def test_profiler_samples_only_the_threads_of_its_request():
+    trace = Trace('GET', '/movies', '')
+    stop = threading.Event()
+    noise = threading.Thread(target=unrelated_request_work, args=(stop,))
+    noise.start()
+    token = _current_trace.set(trace)
+    try:
+        with SamplingProfiler(trace, interval=0.002) as profiler:
+            # like a `def` endpoint: a threadpool thread running in a copy of the request context
+            worker = threading.Thread(target=contextvars.copy_context().run, args=(profiled_request_work,))
+            worker.start()
+            worker.join()
+    finally:
+        _current_trace.reset(token)
+        stop.set()
+        noise.join()
+
+    stacks = profiler.collapsed()
+    assert 'profiled_request_work' in stacks
+    assert 'unrelated_request_work' not in stacks
+
+
+def http_scope(path, headers=()):
+    return {'type': 'http', 'method': 'GET', 'path': path, 'query_string': b'', 'headers': list(headers)}
+
+
+def call(middleware, scope):
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(middleware(scope, receive, send))
+    return messages
+
+
+async def endpoint(scope, receive, send):
+    with span('handler'):
+        pass
+    await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+    await send({'type': 'http.response.body', 'body': b'ok'})
+
+
+def test_requests_are_not_traced_without_admin_token():
+    buffer = SlowTraceBuffer(10)
+    middleware = ProfilingMiddleware(endpoint, admin_token=None, slow_ms=0, buffer=buffer)
+    messages = call(middleware, http_scope('/movies', [(b'x-profile', b'1')]))
+    assert messages[-1]['body'] == b'ok'
+    assert buffer.recent() == []
+
+
+def test_slow_requests_are_kept_with_their_spans():
+    buffer = SlowTraceBuffer(10)
+    middleware = ProfilingMiddleware(endpoint, admin_token='secret', slow_ms=0, buffer=buffer)
+    call(middleware, http_scope('/movies'))
+    [trace] = buffer.recent()
+    assert trace['status'] == 200 and [s['name'] for s in trace['spans']] == ['handler']
+    assert call(middleware, http_scope('/movies', [(b'x-profile', b'1')]))[0]['status'] == 403
@@ -0,0 +1,76 @@
+import pytest
+
+from review_batching import ReviewWindow, aggregate_scores, build_batches, split_windows
+
+CLS, SEP = 2, 3
+
+
+def bodies(windows):
+    return [window.input_ids[1:-1] for window in windows]
+
+
+@pytest.mark.parametrize('length, starts', [
+    (509, [0]),
+    (510, [0]),
+    (511, [0, 382]),
+    # the second window ends exactly on the last token: no third one
+    (892, [0, 382]),
+    (1000, [0, 382, 764]),
+])
+def test_windows_cover_the_review_with_stride_overlap(length, starts):
+    token_ids = list(range(100, 100 + length))
+    windows = split_windows('review', token_ids, CLS, SEP, max_length=512, stride=128)
+
+    assert [window.input_ids[0] for window in windows] == [CLS] * len(starts)
+    assert [window.input_ids[-1] for window in windows] == [SEP] * len(starts)
+    assert all(window.length <= 512 and window.key == 'review' for window in windows)
+    # every window is a contiguous slice starting `max_length - 2 - stride` after the previous one
+    assert bodies(windows) == [token_ids[start:start + 510] for start in starts]
+    # nothing truncated: the last window reaches the end of the review
+    assert sorted({token for body in bodies(windows) for token in body}) == token_ids
+    for previous, following in zip(bodies(windows), bodies(windows)[1:]):
+        assert previous[-128:] == following[:128]
+
+
+def test_invalid_window_settings():
+    with pytest.raises(ValueError):
+        split_windows('review', [10], CLS, SEP, max_length=2)
+    with pytest.raises(ValueError):
+        split_windows('review', [10], CLS, SEP, max_length=12, stride=10)
+
+
+def test_batches_stay_within_the_token_budget():
+    windows = [ReviewWindow(key, [CLS] + [10] * length + [SEP]) for key, length in enumerate(
+        [510, 3, 40, 40, 120, 7, 255, 1, 510, 64, 64, 300, 18, 510])]
+    budget = 1024
+    batches = build_batches(windows, budget)
+
+    assert sorted(id(window) for batch in batches for window in batch) == sorted(id(window) for window in windows)
+    for batch in batches:
+        max_len = max(window.length for window in batch)
+        assert len(batch) * max_len <= budget
+    # bucketed by length: batches do not interleave
+    lengths = [[window.length for window in batch] for batch in batches]
+    assert [length for batch in lengths for length in batch] == sorted(window.length for window in windows)
+    # filled greedily: the next window would have broken the budget
+    for batch, following in zip(batches, batches[1:]):
+        assert (len(batch) + 1) * following[0].length > budget
+
+
+def test_a_window_longer_than_the_budget_gets_its_own_batch():
+    windows = [ReviewWindow('short', [CLS, 10, SEP]), ReviewWindow('long', [CLS] + [10] * 510 + [SEP])]
+    assert [[window.key for window in batch] for batch in build_batches(windows, 256)] == [['short'], ['long']]
+
+
+def test_scores_are_averaged_by_window_length():
+    windows = [
+        ReviewWindow('long', [CLS] + [10] * 510 + [SEP]),
+        ReviewWindow('short', [CLS, 10, SEP]),
+        ReviewWindow('long', [CLS] + [10] * 126 + [SEP]),
+    ]
+    scores = [[0.9, 0.1], [0.3, 0.7], [0.1, 0.9]]
+
+    aggregated = aggregate_scores(windows, scores)
+    assert aggregated['short'] == pytest.approx([0.3, 0.7])
+    assert aggregated['long'] == pytest.approx([(0.9 * 512 + 0.1 * 128) / 640, (0.1 * 512 + 0.9 * 128) / 640])
+    assert sum(aggregated['long']) == pytest.approx(1.0)
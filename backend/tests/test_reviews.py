@@ -0,0 +1,73 @@
+import pytest
+
+
+def create_movie(client, title='기생충'):
+    response = client.post('/movies', json={'title': title, 'director': '봉준호', 'category': '드라마'})
+    assert response.status_code == 201
+    return response.json()['id']
+
+
+def all_reviews(client, movie_id):
+    return client.get(f'/movies/{movie_id}/reviews', params={'limit': 100}).json()
+
+
+def test_keyset_paging_newest_first(client):
+    movie_id = create_movie(client)
+    review_ids = [client.post(f'/movies/{movie_id}/reviews', json=f'리뷰 {number}').json()['id'] for number in range(5)]
+
+    pages = []
+    cursor = None
+    while True:
+        params = {'limit': 2} if cursor is None else {'limit': 2, 'cursor': cursor}
+        page = client.get(f'/movies/{movie_id}/reviews', params=params).json()
+        assert page['total'] == 5
+        pages.append([review['id'] for review in page['items']])
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    newest_first = review_ids[::-1]
+    assert pages == [newest_first[0:2], newest_first[2:4], newest_first[4:]]
+
+    # a page ending exactly on the last review has no next cursor
+    page = client.get(f'/movies/{movie_id}/reviews', params={'limit': 5}).json()
+    assert len(page['items']) == 5 and page['next_cursor'] is None
+    assert client.get('/movies/999/reviews').status_code == 404
+
+
+def test_resubmitting_the_same_review_appends_nothing(client):
+    movie_id = create_movie(client)
+    assert client.post(f'/movies/{movie_id}/review', json='좋은 영화').json()['review_count'] == 1
+    movie = client.post(f'/movies/{movie_id}/review', json='좋은 영화').json()
+    assert (movie['review'], movie['review_count']) == ('좋은 영화', 1)
+
+    movie = client.post(f'/movies/{movie_id}/review', json='다시 보니 별로')
+    assert (movie.json()['review'], movie.json()['review_count']) == ('다시 보니 별로', 2)
+    assert [review['text'] for review in all_reviews(client, movie_id)['items']] == ['다시 보니 별로', '좋은 영화']
+
+
+def test_aggregates_are_maintained_incrementally(client, stub_model):
+    movie_id = create_movie(client)
+    for text in ('재밌다', '지루하다'):
+        client.post(f'/movies/{movie_id}/reviews', json=text)
+    client.post('/movies/review_analyze')
+
+    def positives():
+        return [review['sentiment']['positive'] for review in all_reviews(client, movie_id)['items'] if review['sentiment']]
+
+    movie = client.get('/movies/filter', params={'title': '기생충'}).json()[0]
+    assert movie['review_count'] == 2
+    assert movie['sentiment_mean'] == pytest.approx(sum(positives()) / 2)
+
+    # a new review counts at once, its sentiment only once analyzed
+    client.post(f'/movies/{movie_id}/reviews', json='배우들 연기가 좋다')
+    movie = client.get('/movies/filter', params={'title': '기생충'}).json()[0]
+    assert movie['review_count'] == 3 and movie['sentiment_mean'] == pytest.approx(sum(positives()) / 2)
+
+    # the legacy review resubmitted by the update page is neither stored nor scored twice
+    client.post(f'/movies/{movie_id}/review', json='재밌다')
+    client.post(f'/movies/{movie_id}/review', json='재밌다')
+    client.post('/movies/review_analyze')
+    movie = client.get('/movies/filter', params={'title': '기생충'}).json()[0]
+    assert movie['review_count'] == 4
+    assert len(positives()) == 4
+    assert movie['sentiment_mean'] == pytest.approx(sum(positives()) / 4)
@@ -0,0 +1,71 @@
+import pytest
+
+from suggest_index import SuggestIndex, to_jamo
+
+
+@pytest.fixture
+def index():
+    index = SuggestIndex()
+    index.build([
+        (1, '범죄도시', '강윤성'),
+        (2, '기생충', '봉준호'),
+        (3, '범죄와의 전쟁', '윤종빈'),
+        (4, '버지니아', '봉만대'),
+        (5, '괴물', '봉준호'),
+        (6, 'The Host', 'Bong Joon-ho'),
+        (7, '닭강정', '이병헌'),
+    ])
+    return index
+
+
+def texts(index, prefix, field=None):
+    return sorted(suggestion['text'] for suggestion in index.suggest(prefix, limit=20, field=field))
+
+
+def test_to_jamo_spells_keystrokes():
+    assert to_jamo('범죄도시') == 'ㅂㅓㅁㅈㅗㅣㄷㅗㅅㅣ'
+    assert to_jamo('닭') == 'ㄷㅏㄹㄱ'
+    assert to_jamo('Host') == 'Host'
+
+
+def test_complete_syllables_match_exactly(index):
+    # the syllable before a bare consonant is not reduced to its choseong
+    assert texts(index, '범ㅈ') == ['범죄도시', '범죄와의 전쟁']
+    assert texts(index, '봉ㅈ') == ['봉준호']
+    assert texts(index, '범죄ㄷ') == ['범죄도시']
+
+
+def test_syllable_being_typed_matches(index):
+    assert texts(index, '버') == ['버지니아', '범죄도시', '범죄와의 전쟁']
+    assert texts(index, '범조') == ['범죄도시', '범죄와의 전쟁']
+    # the IME attaches the next initial consonant as a final one: 벚 on the way to 버지
+    assert texts(index, '벚') == ['버지니아']
+    assert texts(index, '달') == ['닭강정']
+    assert texts(index, '괴') == ['괴물']
+
+
+def test_choseong_only_queries(index):
+    assert texts(index, 'ㅂㅈㄷㅅ') == ['범죄도시']
+    assert texts(index, 'ㅂㅈㅎ', field='director') == ['봉준호']
+    assert texts(index, 'ㅈㅈ') == ['범죄와의 전쟁']
+
+
+def test_word_starts_and_case(index):
+    assert texts(index, '전쟁') == ['범죄와의 전쟁']
+    assert texts(index, 'host') == ['The Host']
+    assert texts(index, 'joon', field='director') == ['Bong Joon-ho']
+
+
+def test_incremental_updates(index):
+    index.update(1, '범죄도시 2', '이상용')
+    assert texts(index, '범죄도시') == ['범죄도시 2']
+    index.remove(1)
+    assert texts(index, 'ㅂㅈㄷㅅ') == []
+
+
+def test_update_with_same_values_keeps_entries(index):
+    entries = list(index._entries)
+    index.update(2, '기생충', '봉준호')
+    assert index._entries == entries
+    index.build([(1, '범죄도시', '강윤성')], seq=42)
+    assert index.seq == 42 and texts(index, '기') == []
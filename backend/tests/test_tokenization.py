@@ -0,0 +1,80 @@
+import random
+
+import pytest
+
+from tokenization import PROBE_TEXTS, KoBertFastTokenizer, load_fast_tokenizer, same_token_ids
+from kobert_reference import KoBertTokenizer
+
+WORDS = ('영화 배우 연기 감독 스토리 최고 최악 재미 재밌다 지루 했다 좋았다 별로 기대 이상 마동석 봉준호 기생충 '
+         '범죄도시 캐릭터 슈퍼히어로물 형사물 울었다 웃었다 음악 장면 액션 결말 반전 추천 강추 시간 아깝다 정말 '
+         '너무 진짜 그냥 완전 보고 싶다 다시 극장 관객 평점 감동 눈물 ㅋㅋㅋ ㅠㅠ ㅎㅎ').split()
+ENGLISH = 'great acting story movie would watch again the best worst ever boring fun'.split()
+
+EDGE_TEXTS = [
+    '관객 1,000명, 매출 25,300원, 10,000,',
+    '평점 9,5 ... 3,14,15 그리고 7,',
+    '``인용``과 \'\'따옴표\'\' 그리고 "쌍따옴표"',
+    'Café naïve résumé ﬁlm ¨ 영화',
+    '전각 １２，３４５ 숫자와 ＡＢＣ',
+    '구분자\x1c\x1d\x1e\x1f섞인　공백 리뷰\r\n끝',
+    '처음 [CLS] 가운데 [MASK]끝[SEP]',
+    '漢字 リーグ 😀 모르는 글자들',
+    '   ',
+    'ㅋ',
+]
+
+
+def random_reviews(rng, count):
+    reviews = []
+    for _ in range(count):
+        tokens = []
+        for _ in range(rng.randint(3, 12)):
+            r = rng.random()
+            if r < 0.7:
+                tokens.append(rng.choice(WORDS) + (rng.choice(['.', '!', '?', ',', '...', '~']) if rng.random() < 0.2 else ''))
+            elif r < 0.85:
+                tokens.append(rng.choice(ENGLISH))
+            else:
+                tokens.append(f'{rng.randint(1, 99)},{rng.randint(0, 999):03d}' + rng.choice(['원', '명', '', ',']))
+        reviews.append(' '.join(tokens))
+    return reviews
+
+
+@pytest.fixture(scope='module')
+def slow_tokenizer(tmp_path_factory):
+    '''KoBERT-shaped tokenizer: a small sentencepiece unigram model and a vocab.txt numbering its pieces differently.'''
+    spm = pytest.importorskip('sentencepiece')
+    directory = tmp_path_factory.mktemp('kobert')
+    spm.SentencePieceTrainer.train(sentence_iterator=iter(random_reviews(random.Random(0), 4000)),
+                                   model_prefix=str(directory / 'sp'), vocab_size=400, model_type='unigram',
+                                   character_coverage=0.995, minloglevel=2)
+    sp_model = spm.SentencePieceProcessor(model_file=str(directory / 'sp.model'))
+    pieces = [sp_model.id_to_piece(i) for i in range(sp_model.get_piece_size())
+              if not (sp_model.is_unknown(i) or sp_model.is_control(i))]
+    # sorted like KoBERT's vocab.txt, and a few pieces missing from it (they become [UNK])
+    vocab = ['[UNK]', '[PAD]', '[CLS]', '[SEP]', '[MASK]'] + [piece for i, piece in enumerate(sorted(pieces)) if i % 40 != 7]
+    (directory / 'vocab.txt').write_text('\n'.join(vocab) + '\n', encoding='utf-8')
+    return KoBertTokenizer(str(directory / 'sp.model'), str(directory / 'vocab.txt'))
+
+
+def test_fast_tokenizer_reproduces_kobert_ids(slow_tokenizer):
+    fast_tokenizer = KoBertFastTokenizer(slow_tokenizer)
+    texts = PROBE_TEXTS + EDGE_TEXTS + random_reviews(random.Random(1), 500)
+    for add_special_tokens in (False, True):
+        slow_ids = slow_tokenizer(texts, add_special_tokens=add_special_tokens)['input_ids']
+        fast_ids = fast_tokenizer(texts, add_special_tokens=add_special_tokens)['input_ids']
+        for text, slow, fast in zip(texts, slow_ids, fast_ids):
+            assert fast == slow, text
+
+
+def test_digit_comma_pieces_are_split(slow_tokenizer):
+    fast_tokenizer = KoBertFastTokenizer(slow_tokenizer)
+    ids = fast_tokenizer('관객 1,000명', add_special_tokens=False)['input_ids']
+    assert slow_tokenizer.convert_ids_to_tokens(ids).count(',') == 1
+
+
+def test_load_fast_tokenizer_uses_the_kobert_converter(slow_tokenizer):
+    fast_tokenizer = load_fast_tokenizer(slow_tokenizer)
+    assert isinstance(fast_tokenizer, KoBertFastTokenizer)
+    assert fast_tokenizer.cls_token_id == 2 and fast_tokenizer.sep_token_id == 3 and fast_tokenizer.pad_token_id == 1
+    assert same_token_ids(slow_tokenizer, fast_tokenizer, PROBE_TEXTS)
@@ -0,0 +1,269 @@
+import sys
+import hashlib
+import logging
+import unicodedata
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+# Sentences used to verify that the fast tokenizer reproduces the slow one
+PROBE_TEXTS = [
+    '형사물이라기보다 마동석 캐릭터의 슈퍼히어로물',
+    '어떤 상황에서도 그의 활약을 조바심 없이 즐길 수 있는 아는 맛.',
+    '"기겁할 정도로 울었다. 울면서도 기분이 나쁘지 않았던 이유? 배우들 덕분이다."',
+    '변주는 됐고, 변화가 필요할때 ㅋㅋㅋ ㅠㅠ!!',
+    'Great acting and story! 10/10, would watch again.',
+    '영화 "기생충"(2019)은 봉준호 감독의 작품이다.',
+    '  공백이   많은    리뷰\t그리고 탭\n줄바꿈  ',
+    '이모지도 섞인 리뷰 🎬👍 and mixed English 단어',
+    '',
+]
+
+# int16 is enough for vocabularies below 32768 ids (KoBERT: 8002)
+INT16_MAX = 32767
+
+SPIECE_UNDERLINE = '\u2581'
+
+
+def review_hash(tokenizer_name: str, text: str) -> str:
+    '''
+    Cache key of a review: the tokenizer name is part of the key, so changing the tokenizer invalidates old entries.
+    '''
+    return hashlib.sha1(f'{tokenizer_name}\0{text}'.encode('utf-8')).hexdigest()
+
+
+def encode_token_ids(token_ids: Sequence[int]) -> Tuple[str, bytes]:
+    '''
+    Pack token ids into a compact little-endian blob.
+    Returns:
+        (typecode, blob): 'h' for int16 or 'i' for int32.
+    '''
+    typecode = 'h' if all(0 <= tid <= INT16_MAX for tid in token_ids) else 'i'
+    packed = array(typecode, token_ids)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return typecode, packed.tobytes()
+
+
+def decode_token_ids(typecode: str, blob: bytes) -> List[int]:
+    packed = array(typecode)
+    packed.frombytes(blob)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tolist()
+
+
+def same_token_ids(slow_tokenizer, fast_tokenizer, texts: Sequence[str]) -> bool:
+    '''
+    Check that both tokenizers produce identical ids (with and without special tokens).
+    '''
+    texts = list(texts)
+    for add_special_tokens in (False, True):
+        slow_ids = slow_tokenizer(texts, add_special_tokens=add_special_tokens)['input_ids']
+        fast_ids = fast_tokenizer(texts, add_special_tokens=add_special_tokens)['input_ids']
+        for text, slow, fast in zip(texts, slow_ids, fast_ids):
+            if list(slow) != list(fast):
+                logging.warning(f"Fast tokenizer mismatch on {text!r}: {list(slow)[:10]}... != {list(fast)[:10]}...")
+                return False
+    return True
+
+
+def _protobuf_fields(data: bytes):
+    '''(field number, value) of a serialized protobuf message; length-delimited values as bytes.'''
+    def varint(pos):
+        value = shift = 0
+        while True:
+            byte = data[pos]
+            value |= (byte & 0x7F) << shift
+            pos += 1
+            if byte < 0x80:
+                return value, pos
+            shift += 7
+
+    pos = 0
+    while pos < len(data):
+        key, pos = varint(pos)
+        wire_type = key & 7
+        if wire_type == 0:
+            value, pos = varint(pos)
+        elif wire_type == 1:
+            value, pos = data[pos:pos + 8], pos + 8
+        elif wire_type == 2:
+            length, pos = varint(pos)
+            value, pos = data[pos:pos + length], pos + length
+        elif wire_type == 5:
+            value, pos = data[pos:pos + 4], pos + 4
+        else:
+            raise ValueError(f'Unsupported protobuf wire type {wire_type}')
+        yield key >> 3, value
+
+
+def sentencepiece_normalizer_spec(model_proto: bytes) -> Dict[str, object]:
+    '''
+    Normalization settings of a serialized sentencepiece ModelProto (`normalizer_spec`, field 3),
+    read without the protobuf package.
+    '''
+    spec = {'precompiled_charsmap': b'', 'add_dummy_prefix': True, 'remove_extra_whitespaces': True}
+    for number, value in _protobuf_fields(model_proto):
+        if number == 3:
+            for field, field_value in _protobuf_fields(value):
+                if field == 2:
+                    spec['precompiled_charsmap'] = field_value
+                elif field == 3:
+                    spec['add_dummy_prefix'] = bool(field_value)
+                elif field == 4:
+                    spec['remove_extra_whitespaces'] = bool(field_value)
+    return spec
+
+
+def _char_class(predicate) -> str:
+    '''Regex character class (onig syntax) of the code points matching `predicate`.'''
+    ranges, start = [], None
+    for code in range(sys.maxunicode + 2):
+        if code <= sys.maxunicode and predicate(chr(code)):
+            if start is None:
+                start = code
+        elif start is not None:
+            ranges.append(f'\\x{{{start:X}}}' if start == code - 1 else f'\\x{{{start:X}}}-\\x{{{code - 1:X}}}')
+            start = None
+    return '[' + ''.join(ranges) + ']'
+
+
+class KoBertFastTokenizer:
+    '''
+    Rust-backed (`tokenizers`) equivalent of KoBERT's slow `KoBertTokenizer`.
+
+    KoBERT segments with a sentencepiece unigram model but numbers tokens with its own `vocab.txt`,
+    so the generic transformers converter does not apply. Here `preprocess_text` (whitespace collapse,
+    quote replacement, NFKD without combining marks) and the sentencepiece normalization (precompiled
+    charsmap, dummy prefix) run as `tokenizers` normalizers, the unigram lattice runs on the sentencepiece
+    pieces and the resulting sentencepiece ids are remapped to `vocab.txt` ids (unknown pieces -> [UNK]).
+    Pieces like `1,` (digits then comma) are split again as `KoBertTokenizer._tokenize` does.
+    '''
+
+    is_fast = True
+
+    def __init__(self, slow_tokenizer):
+        from tokenizers import AddedToken, Regex, Tokenizer, normalizers, pre_tokenizers
+        from tokenizers.models import Unigram
+
+        sp_model = slow_tokenizer.sp_model
+        spec = sentencepiece_normalizer_spec(sp_model.serialized_model_proto())
+        self.pieces = [sp_model.id_to_piece(i) for i in range(sp_model.get_piece_size())]
+        vocab = []
+        for i, piece in enumerate(self.pieces):
+            # sentencepiece never matches unknown / control pieces against the text: make them unmatchable
+            if sp_model.is_unknown(i) or sp_model.is_control(i) or sp_model.is_unused(i):
+                piece = f'\x00{piece}'
+            vocab.append((piece, sp_model.get_score(i)))
+
+        sp_normalizers = []
+        if spec['precompiled_charsmap']:
+            # `Precompiled` only maps multi-character graphemes shorter than 6 bytes, so decomposed hangul
+            # syllables (3 jamo, 9 bytes) would stay decomposed: compose them first, as sentencepiece's NFKC map does
+            sp_normalizers += [normalizers.NFC(), normalizers.Precompiled(spec['precompiled_charsmap'])]
+        if spec['remove_extra_whitespaces']:
+            sp_normalizers += [normalizers.Replace(Regex(' {2,}'), ' '), normalizers.Replace(Regex('^ | $'), '')]
+
+        preprocess = []
+        if slow_tokenizer.remove_space:
+            # str.split() whitespace, which is not exactly unicode White_Space
+            preprocess += [normalizers.Replace(Regex(_char_class(str.isspace) + '+'), ' '),
+                           normalizers.Replace(Regex('^ | $'), '')]
+        preprocess += [normalizers.Replace('``', '"'), normalizers.Replace("''", '"')]
+        if not slow_tokenizer.keep_accents:
+            preprocess += [normalizers.NFKD(),
+                           normalizers.Replace(Regex(_char_class(unicodedata.combining)), '')]
+        if slow_tokenizer.do_lower_case:
+            preprocess.append(normalizers.Lowercase())
+
+        def build(steps):
+            tokenizer = Tokenizer(Unigram(vocab, unk_id=sp_model.unk_id(), byte_fallback=False))
+            tokenizer.normalizer = normalizers.Sequence(steps)
+            tokenizer.pre_tokenizer = pre_tokenizers.Metaspace(
+                replacement=SPIECE_UNDERLINE, prepend_scheme='always' if spec['add_dummy_prefix'] else 'never', split=False)
+            return tokenizer
+
+        self._tokenizer = build(preprocess + sp_normalizers)
+        # plain `sp_model.EncodeAsPieces`, for the digit-comma re-split
+        self._sp_tokenizer = build(sp_normalizers)
+        # special tokens are split out of the text before tokenization, as the slow tokenizer does
+        self._tokenizer.add_special_tokens([AddedToken(token, special=True, normalized=False)
+                                            for token in slow_tokenizer.all_special_tokens])
+
+        self.token2idx = slow_tokenizer.token2idx
+        self.unk_token_id = slow_tokenizer.unk_token_id
+        self._to_vocab_id = [self.token2idx.get(piece, self.unk_token_id) for piece in self.pieces]
+        for token in slow_tokenizer.all_special_tokens:
+            fast_id = self._tokenizer.token_to_id(token)
+            if fast_id >= len(self._to_vocab_id):
+                self._to_vocab_id.extend([self.unk_token_id] * (fast_id + 1 - len(self._to_vocab_id)))
+            self._to_vocab_id[fast_id] = slow_tokenizer.convert_tokens_to_ids(token)
+        self._comma_ids = {i for i, piece in enumerate(self.pieces)
+                           if len(piece) > 1 and piece[-1] == ',' and piece[-2].isdigit()}
+
+        self.special_tokens_map = slow_tokenizer.special_tokens_map
+        self.cls_token_id = slow_tokenizer.cls_token_id
+        self.sep_token_id = slow_tokenizer.sep_token_id
+        self.pad_token_id = slow_tokenizer.pad_token_id
+
+    def _vocab_ids(self, sp_ids: List[int]) -> List[int]:
+        if self._comma_ids.isdisjoint(sp_ids):
+            return [self._to_vocab_id[i] for i in sp_ids]
+        ids = []
+        for i in sp_ids:
+            if i not in self._comma_ids:
+                ids.append(self._to_vocab_id[i])
+                continue
+            piece = self.pieces[i]
+            cur_pieces = [self.pieces[j] for j in self._sp_tokenizer.encode(piece[:-1].replace(SPIECE_UNDERLINE, ''),
+                                                                             add_special_tokens=False).ids]
+            if piece[0] != SPIECE_UNDERLINE and cur_pieces[0][0] == SPIECE_UNDERLINE:
+                if len(cur_pieces[0]) == 1:
+                    cur_pieces = cur_pieces[1:]
+                else:
+                    cur_pieces[0] = cur_pieces[0][1:]
+            cur_pieces.append(piece[-1])
+            ids.extend(self.token2idx.get(cur_piece, self.unk_token_id) for cur_piece in cur_pieces)
+        return ids
+
+    def __call__(self, texts: Union[str, Sequence[str]], add_special_tokens: bool = True) -> Dict[str, list]:
+        '''
+        Returns:
+            {'input_ids': ids} (a list of id lists for a list of texts), `[CLS] X [SEP]` with special tokens.
+        '''
+        batch = [texts] if isinstance(texts, str) else list(texts)
+        input_ids = []
+        for encoding in self._tokenizer.encode_batch(batch, add_special_tokens=False):
+            ids = self._vocab_ids(encoding.ids)
+            input_ids.append([self.cls_token_id] + ids + [self.sep_token_id] if add_special_tokens else ids)
+        return {'input_ids': input_ids[0] if isinstance(texts, str) else input_ids}
+
+
+def load_fast_tokenizer(slow_tokenizer, probe_texts: Sequence[str] = PROBE_TEXTS) -> Optional[object]:
+    '''
+    Convert a slow (python / sentencepiece) tokenizer into a Rust-backed `tokenizers` one.
+    The converted tokenizer is only returned when it reproduces the slow tokenizer ids on `probe_texts`,
+    otherwise None and the caller keeps using the slow tokenizer.
+    '''
+    if getattr(slow_tokenizer, 'is_fast', False):
+        return slow_tokenizer
+    try:
+        if hasattr(slow_tokenizer, 'sp_model') and hasattr(slow_tokenizer, 'token2idx'):
+            # KoBertTokenizer: sentencepiece pieces, vocab.txt ids
+            fast_tokenizer = KoBertFastTokenizer(slow_tokenizer)
+        else:
+            from transformers import PreTrainedTokenizerFast
+            from transformers.convert_slow_tokenizer import convert_slow_tokenizer
+
+            fast_tokenizer = PreTrainedTokenizerFast(
+                tokenizer_object=convert_slow_tokenizer(slow_tokenizer),
+                **slow_tokenizer.special_tokens_map,
+            )
+    except Exception as e:
+        logging.warning(f"Fast tokenizer conversion failed, keep slow tokenizer: {e}")
+        return None
+
+    if not same_token_ids(slow_tokenizer, fast_tokenizer, probe_texts):
+        logging.warning("Fast tokenizer does not match the slow tokenizer, keep slow tokenizer")
+        return None
+    return fast_tokenizer
@@ -0,0 +1,41 @@
+'''
+Standalone review analysis worker.
+
+Leases pending movies from the shared DB in chunks and analyzes them, exactly like
+`/movies/review_analyze` does inside the API. Run any number of them next to the API replicas:
+    uv run python worker.py
+'''
+import os
+import time
+import logging
+
+from sqlmodel import Session
+
+import main
+
+# seconds to wait when there is nothing to claim
+WORKER_POLL_INTERVAL = float(os.getenv('WORKER_POLL_INTERVAL', 2.0))
+
+
+def run():
+    if not main.model_is_ready:
+        raise SystemExit("Model is not loaded, worker cannot start")
+
+    main.create_db_and_tables()
+    logging.info(f"Worker {main.WORKER_ID} started (chunk={main.ANALYZE_CHUNK_SIZE}, lease={main.ANALYZE_LEASE_SECONDS}s)")
+    with Session(main.engine) as session:
+        while True:
+            try:
+                analyzed = main.process_analysis_chunk(session)
+            except Exception as e:
+                logging.error(f"Analysis chunk failed: {e}")
+                time.sleep(WORKER_POLL_INTERVAL)
+                continue
+            if analyzed is None:
+                time.sleep(WORKER_POLL_INTERVAL)
+            else:
+                logging.info(f"Worker {main.WORKER_ID} analyzed {len(analyzed)} movies")
+
+
+if __name__ == '__main__':
+    run()
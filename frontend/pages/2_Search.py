@@ -1,6 +1,6 @@
 import streamlit as st
 import requests
-from utils.utils import display_movie_info, show_movie_summary
+from utils.utils import display_movie_info, show_movie_summary, fetch_suggestions
 
 st.set_page_config(page_title="Movie Search", layout="wide", page_icon="🔎")
 
@@ -42,11 +42,23 @@ st.divider()
 st.subheader("🔎 Movie Search")
 mode = st.radio("Search Mode", options=["By Title/Director", "Detailed Search"], horizontal=True)
 
+# ────────────── Type-ahead ──────────────
+suggested_query = ""
+if mode == "By Title/Director":
+    typed = st.text_input("Start typing a title or director (초성 검색 가능, ex. ㅂㅈㄷㅅ):")
+    suggestions = fetch_suggestions(typed)
+    if suggestions:
+        labels = [f"{s['text']} ({s['field']})" for s in suggestions]
+        picked = st.selectbox("Suggestions", options=labels)
+        suggested_query = suggestions[labels.index(picked)]['text']
+    elif typed:
+        st.caption("No suggestions.")
+
 with st.form("search_form"):
     if mode == "By Title/Director":
         search_cols = st.columns([9, 1], vertical_alignment='bottom')
         with search_cols[0]:
-            movie_query = st.text_input("Enter movie title or director name to search:")
+            movie_query = st.text_input("Enter movie title or director name to search:", value=suggested_query)
         with search_cols[1]:
             search_button = st.form_submit_button("🔎 Search", use_container_width=True)
 
@@ -1,6 +1,7 @@
 import streamlit as st
 import requests
-from utils.utils import show_movie_summary
+from utils.utils import show_movie_summary, movies_to_dataframe, show_poster
+import json
 import time
 
 st.set_page_config(page_title="Update Movies", layout="wide", page_icon="⚙")
@@ -56,8 +57,7 @@ with update_cols[0]:
             st.markdown(f"**Current Category:** {movie['category']}")
             st.markdown(f"**Current Rating:** {movie.get('rating', 'N/A')}")
             st.markdown(f"**Current Review:** {movie.get('review', 'N/A')}")
-            if movie.get("image_url"):
-                st.image(movie["image_url"], width=200)
+            show_poster(movie, width=200)
 
 
 # ────────────── Right Column: Update Form ──────────────
@@ -114,18 +114,33 @@ st.divider()
 with st.form("Review Analysis"):
     analyze_review = st.form_submit_button("Analyze Review", use_container_width=True)
     if analyze_review:
-         with st.spinner("Analyzing reviews... Please wait."):
-            try:
-                response = requests.post(f"{BASE_URL}/movies/review_analyze")
-                if response.status_code == 200:
-                    st.success("✅ Review analysis completed.")
-                    analyzed_movies = response.json()
-                    st.session_state.movie_list = analyzed_movies
-                    time.sleep(0.5)
-                    st.rerun()
-                else:
+        progress_bar = st.progress(0.0, text="Analyzing reviews... Please wait.")
+        live_table = st.empty()
+        try:
+            # results arrive as NDJSON lines, one per committed batch
+            with requests.post(f"{BASE_URL}/movies/review_analyze/stream", stream=True) as response:
+                if response.status_code != 200:
                     st.error(f"❌ Analysis failed: {response.status_code} - {response.text}")
-            except requests.exceptions.RequestException as e:
-                st.error(f"🚨 Request failed: {e}")
+                else:
+                    failed = False
+                    for line in response.iter_lines(decode_unicode=True):
+                        if not line:
+                            continue
+                        event = json.loads(line)
+                        if event["event"] == "batch":
+                            updated = {m["id"]: m for m in event["movies"]}
+                            st.session_state.movie_list = [updated.get(m["id"], m) for m in st.session_state.movie_list]
+                            progress_bar.progress(event["done"] / event["total"], text=f"Analyzed {event['done']} / {event['total']} movies")
+                            live_table.dataframe(movies_to_dataframe(st.session_state.movie_list))
+                        elif event["event"] == "error":
+                            failed = True
+                            st.error(f"❌ Analysis stopped after {event['done']} movies: {event['detail']}")
+                    if not failed:
+                        progress_bar.progress(1.0, text="Done")
+                        st.success("✅ Review analysis completed.")
+                        time.sleep(0.5)
+                        st.rerun()
+        except requests.exceptions.RequestException as e:
+            st.error(f"🚨 Request failed: {e}")
 
 st.markdown("""<hr style="height:2px;border:none;background-color:red;" />""", unsafe_allow_html=True)
\ No newline at end of file
@@ -0,0 +1,88 @@
+from types import SimpleNamespace
+
+import pytest
+
+from utils import utils
+
+BASE_URL = "http://backend"
+
+
+class SessionState(dict):
+    """Stand-in for `st.session_state` (item and attribute access)."""
+    __getattr__ = dict.__getitem__
+    __setattr__ = dict.__setitem__
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None, headers=None):
+        self.status_code = status_code
+        self.payload = payload
+        self.headers = headers or {}
+
+    def json(self):
+        return self.payload
+
+
+def movie(movie_id, title):
+    return {"id": movie_id, "title": title, "director": "감독", "category": "드라마"}
+
+
+def page(changes, next_since, has_more=False):
+    return FakeResponse(200, {"changes": changes, "next_since": next_since, "has_more": has_more})
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    """Answers GET requests from `routes` ({(path, since): response}) and records the `since` of each call."""
+    state = SessionState(base_url=BASE_URL, movie_list=[movie(1, "기생충"), movie(2, "괴물")], change_seq=10)
+    fake = SimpleNamespace(routes={}, calls=[])
+
+    def get(url, params=None, timeout=None):
+        since = (params or {}).get("since")
+        fake.calls.append((url[len(BASE_URL):], since))
+        return fake.routes[(url[len(BASE_URL):], since)]
+
+    monkeypatch.setattr(utils, "st", SimpleNamespace(session_state=state, error=lambda message: None))
+    monkeypatch.setattr(utils.requests, "get", get)
+    fake.state = state
+    return fake
+
+
+def test_has_more_pages_are_followed(backend):
+    backend.routes[("/movies/changes", 10)] = page([
+        {"seq": 11, "op": "update", "movie_id": 1, "movie": movie(1, "기생충 흑백판")},
+    ], next_since=11, has_more=True)
+    backend.routes[("/movies/changes", 11)] = page([
+        {"seq": 12, "op": "insert", "movie_id": 3, "movie": movie(3, "마더")},
+        {"seq": 13, "op": "delete", "movie_id": 2, "movie": None},
+    ], next_since=13)
+
+    assert utils.apply_movie_changes(BASE_URL)
+    assert backend.calls == [("/movies/changes", 10), ("/movies/changes", 11)]
+    assert [m["title"] for m in backend.state.movie_list] == ["기생충 흑백판", "마더"]
+    assert backend.state.change_seq == 13
+
+
+def test_deleted_then_reinserted_id(backend):
+    # entries carry the current row: the delete of a reused id already holds the new movie
+    backend.routes[("/movies/changes", 10)] = page([
+        {"seq": 11, "op": "delete", "movie_id": 2, "movie": movie(2, "옥자")},
+        {"seq": 12, "op": "insert", "movie_id": 2, "movie": movie(2, "옥자")},
+    ], next_since=12)
+
+    assert utils.apply_movie_changes(BASE_URL)
+    assert backend.state.movie_list == [movie(1, "기생충"), movie(2, "옥자")]
+
+
+def test_since_older_than_horizon_reloads(backend):
+    backend.routes[("/movies/changes", 10)] = FakeResponse(410, {"detail": "compacted"})
+    listing = [movie(1, "기생충"), movie(4, "살인의 추억")]
+    backend.routes[("/movies", None)] = FakeResponse(200, listing, {"X-Change-Seq": "42"})
+
+    # the cached list is left as is, the caller reloads everything
+    assert not utils.apply_movie_changes(BASE_URL)
+    assert backend.state.change_seq == 10
+
+    utils.fetch_movie()
+    assert backend.state.movie_list == listing
+    assert backend.state.change_seq == 42
@@ -2,19 +2,65 @@ import streamlit as st
 import pandas as pd
 import requests
 import time
+import logging
+import hashlib
 
 def fetch_movie():
+    BASE_URL = st.session_state.get("base_url")
+    # incremental sync: only fetch what changed since the last full load
+    if st.session_state.get("change_seq") is not None and st.session_state.get("movie_list"):
+        try:
+            if apply_movie_changes(BASE_URL):
+                return
+        except Exception as e:
+            logging.warning(f"Incremental sync failed, reloading all movies: {e}")
     try:
-        BASE_URL = st.session_state.get("base_url")
         response = requests.get(f"{BASE_URL}/movies")
         if response.status_code == 200:
             st.session_state.movie_list = response.json()
+            st.session_state.change_seq = int(response.headers.get("X-Change-Seq", 0))
         else:
             st.error(f"Failed to fetch movie data (Status: {response.status_code})")
             st.session_state.movie_list = []
+            st.session_state.change_seq = None
     except Exception as e:
         st.error(f"Error fetching data: {e}")
         st.session_state.movie_list = []
+        st.session_state.change_seq = None
+
+def apply_movie_changes(base_url):
+    """Apply `/movies/changes` to the cached movie list. Returns False when a full reload is needed."""
+    movies = {m["id"]: m for m in st.session_state.movie_list}
+    since = st.session_state.change_seq
+    while True:
+        response = requests.get(f"{base_url}/movies/changes", params={"since": since, "limit": 500}, timeout=5)
+        if response.status_code != 200:
+            # 410: the log was compacted past `since`
+            return False
+        page = response.json()
+        for change in page["changes"]:
+            if change["movie"] is None:
+                movies.pop(change["movie_id"], None)
+            else:
+                movies[change["movie_id"]] = change["movie"]
+        since = page["next_since"]
+        if not page["has_more"]:
+            break
+    st.session_state.movie_list = [movies[movie_id] for movie_id in sorted(movies)]
+    st.session_state.change_seq = since
+    return True
+
+def fetch_suggestions(prefix, limit=10):
+    if not prefix or not prefix.strip():
+        return []
+    try:
+        BASE_URL = st.session_state.get("base_url")
+        response = requests.get(f"{BASE_URL}/movies/suggest", params={"prefix": prefix.strip(), "limit": limit}, timeout=2)
+        if response.status_code == 200:
+            return response.json()
+    except requests.RequestException:
+        pass
+    return []
 
 def show_movie_summary():
     st.subheader("Available Movies")
@@ -27,34 +73,60 @@ def show_movie_summary():
     
     if len(st.session_state.movie_list) > 0:
         st.write(f"Total Movies: {len(st.session_state.movie_list)}")
-        records = []
-        for movie in st.session_state.movie_list:
-            base_info = {
-                'id': movie['id'],
-                'title': movie['title'],
-                'director': movie['director'],
-                'category': movie['category'],
-                'rating': movie.get('rating'),
-                'review': movie.get('review'),
-            }
-
-            sentiment = movie.get('predicted_sentiment', None)
-            if sentiment:
-                base_info['positive'] = sentiment.get('positive')
-                base_info['negative'] = sentiment.get('negative')
-            else:
-                base_info['positive'] = None
-                base_info['negative'] = None
-
-            records.append(base_info)
-        df = pd.DataFrame(records)
-        df.set_index('id', inplace=True)
+        df = movies_to_dataframe(st.session_state.movie_list)
 
     else:
         st.info("No movies available. Please add some movies first.")
         return pd.DataFrame()
     return df
 
+def movies_to_dataframe(movie_list):
+    records = []
+    for movie in movie_list:
+        base_info = {
+            'id': movie['id'],
+            'title': movie['title'],
+            'director': movie['director'],
+            'category': movie['category'],
+            'rating': movie.get('rating'),
+            'review': movie.get('review'),
+            'reviews': movie.get('review_count', 0),
+            'mean positive': movie.get('sentiment_mean'),
+        }
+
+        sentiment = movie.get('predicted_sentiment', None)
+        if sentiment:
+            base_info['positive'] = sentiment.get('positive')
+            base_info['negative'] = sentiment.get('negative')
+        else:
+            base_info['positive'] = None
+            base_info['negative'] = None
+
+        records.append(base_info)
+    df = pd.DataFrame(records)
+    df.set_index('id', inplace=True)
+    return df
+
+@st.cache_data(max_entries=512, show_spinner=False)
+def load_poster(base_url, movie_id, width, version):
+    """Thumbnail bytes from the backend poster proxy (`version` changes with the poster url)."""
+    response = requests.get(f"{base_url}/images/{movie_id}", params={"w": width, "v": version},
+                            headers={"Accept": "image/webp,image/jpeg"}, timeout=10)
+    response.raise_for_status()
+    return response.content
+
+def show_poster(movie, width):
+    image_url = movie.get("image_url")
+    if not image_url:
+        return
+    # same version as the backend: first 12 hex digits of sha1(image_url)
+    version = hashlib.sha1(image_url.encode("utf-8")).hexdigest()[:12]
+    try:
+        st.image(load_poster(st.session_state.get("base_url"), movie["id"], width, version), width=width)
+    except Exception as e:
+        logging.warning(f"Poster proxy failed for movie {movie['id']}: {e}")
+        st.image(image_url, width=width)
+
 def display_movie_info(movie_list, header):
     st.subheader(header)
     movie_data = [movie_list] if isinstance(movie_list, dict) else movie_list
@@ -63,9 +135,7 @@ def display_movie_info(movie_list, header):
     cols = st.columns(len(movie_data))
     for movie, col in zip(movie_data, cols):
         with col:
-            movie_url = movie.get("image_url")
-            if movie_url:
-                st.image(movie["image_url"], width=140)
+            show_poster(movie, width=140)
             st.markdown(f"""
                 **Title:** {movie['title']}  
                 **Director:** {movie['director']}  